@@ -0,0 +1,385 @@
+"""
+Offline benchmark of the client collectors
+
+Runs get_status() plus serialisation against a fixture root (proc/, sys/,
+etc/, run/) and a fake nvidia-smi / users (fixtures/bin) replaying recorded
+outputs, so it works on a plain Linux box without GPUs. GPU compute processes are
+real `sleep` children, so the per-process lookups do real work; psutil
+itself keeps reading the live /proc.
+
+Each scenario runs in a fresh interpreter and reports per-tick latency,
+per-tick allocations (tracemalloc, in a separate pass) and peak RSS.
+
+Usage:
+    python benchmarks/bench_collectors.py [--ticks 50] [--output out.json]
+    python benchmarks/bench_collectors.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "client"))
+
+from users import USER_PROCESS, UTMP_STRUCT  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# (gpus, compute processes)
+SCENARIOS = [(1, 0), (4, 0), (4, 20), (8, 20), (8, 100), (8, 200)]
+
+
+###############################################################################
+## Fixtures
+
+
+def make_fixture_root(
+    directory: Path, cpu_cores: int = 64, users: int = 2000, processes: int = 1000
+) -> None:
+    proc = directory / "proc"
+    etc = directory / "etc"
+    proc.mkdir(parents=True)
+    etc.mkdir(parents=True)
+
+    (proc / "uptime").write_text("1234567.89 76543210.12\n")
+    (proc / "stat").write_text(
+        "cpu  4705 356 584 3699176 23060 0 277 0 0 0\n"
+        + "".join(f"cpu{i} 73 5 9 57799 360 0 4 0 0 0\n" for i in range(cpu_cores))
+    )
+    cpuinfo = []
+    for i in range(cpu_cores):
+        cpuinfo.append(
+            f"processor\t: {i}\n"
+            "vendor_id\t: AuthenticAMD\n"
+            "model name\t: AMD EPYC 7763 64-Core Processor\n"
+            "cpu MHz\t\t: 2445.404\n"
+            "cache size\t: 512 KB\n"
+            f"core id\t\t: {i}\n"
+            "flags\t\t: fpu vme de pse tsc msr pae mce cx8 apic sep mtrr\n"
+        )
+    (proc / "cpuinfo").write_text("\n".join(cpuinfo))
+
+    # per-process stat files for the per-user accounting scan
+    for pid in range(1000, 1000 + processes):
+        (proc / str(pid)).mkdir()
+        (proc / str(pid) / "stat").write_text(
+            f"{pid} (python train.py) S 1 {pid} {pid} 0 -1 4194560 5000 0 0 0 "
+            f"{pid * 3} {pid} 0 0 20 0 8 0 {pid * 7} 4000000000 250000 "
+            "18446744073709551615 1 1 0 0 0 0 0 16781312 2 0 0 0 17 3 0 0 0 0 0\n"
+        )
+
+    passwd = [
+        "root:x:0:0:root:/root:/bin/bash",
+        "daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin",
+        "nobody:x:65534:65534:nobody:/nonexistent:/usr/sbin/nologin",
+    ]
+    for i in range(users):
+        passwd.append(
+            f"user{i:04d}:x:{1000 + i}:{1000 + i}:User {i}:/home/user{i:04d}:/bin/bash"
+        )
+    (etc / "passwd").write_text("\n".join(passwd) + "\n")
+    (directory / "users").write_text(
+        " ".join(f"user{i:04d}" for i in range(0, users, 97)) + "\n"
+    )
+
+    # utmp with a login session per online user, owned by a live pid
+    run = directory / "run"
+    run.mkdir()
+    records = []
+    for n, i in enumerate(range(0, users, 97)):
+        records.append(
+            UTMP_STRUCT.pack(
+                USER_PROCESS,
+                0,
+                os.getpid(),
+                f"pts/{n}".encode(),
+                b"",
+                f"user{i:04d}".encode(),
+                b"10.0.0.1",
+                0,
+                0,
+                0,
+                0,
+                0,
+                b"",
+                b"",
+            )
+        )
+    (run / "utmp").write_bytes(b"".join(records))
+
+    # network interfaces, counters advance between ticks in real agents but
+    # the parsing cost is the same
+    interfaces = ["lo", "eno1", "eno2", "ib0", "docker0"]
+    (proc / "net").mkdir()
+    (proc / "net" / "dev").write_text(
+        "Inter-|   Receive                            "
+        "                    |  Transmit\n"
+        " face |bytes    packets errs drop fifo frame compressed multicast"
+        "|bytes    packets errs drop fifo colls carrier compressed\n"
+        + "".join(
+            f"{name:>6}: {1000000 * i} {1000 * i} 0 0 0 0 0 0 "
+            f"{2000000 * i} {2000 * i} 0 0 0 0 0 0\n"
+            for i, name in enumerate(interfaces)
+        )
+    )
+    for name in interfaces:
+        (directory / "sys" / "class" / "net" / name).mkdir(parents=True)
+        (directory / "sys" / "class" / "net" / name / "operstate").write_text("up\n")
+
+    # block devices: NVMe disks with partitions, plus loop devices to skip
+    disks = [f"nvme{i}n1" for i in range(4)]
+    diskstats = []
+    for i, disk in enumerate(disks):
+        (directory / "sys" / "block" / disk).mkdir(parents=True)
+        for name in [disk] + [f"{disk}p{p}" for p in range(1, 3)]:
+            diskstats.append(
+                f" 259 {i} {name} 1814507 12 94735054 274150 5416384 3381498 "
+                "267409232 4838962 0 1656536 5113112 0 0 0 0 157434 0"
+            )
+    diskstats += [
+        f"   7 {i} loop{i} 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0" for i in range(8)
+    ]
+    (proc / "diskstats").write_text("\n".join(diskstats) + "\n")
+
+    # hwmon: CPU package + cores, an NVMe drive and a fan controller
+    hwmon = directory / "sys" / "class" / "hwmon"
+    chips = [
+        ("coretemp", "temp", ["Package id 0"] + [f"Core {i}" for i in range(16)]),
+        ("nvme", "temp", ["Composite"]),
+        ("nct6775", "fan", [f"fan{i}" for i in range(1, 6)]),
+    ]
+    for n, (chip, kind, labels) in enumerate(chips):
+        chip_dir = hwmon / f"hwmon{n}"
+        chip_dir.mkdir(parents=True)
+        (chip_dir / "name").write_text(chip + "\n")
+        for i, label in enumerate(labels, start=1):
+            (chip_dir / f"{kind}{i}_label").write_text(label + "\n")
+            if kind == "fan":
+                (chip_dir / f"fan{i}_input").write_text(f"{1200 + 10 * i}\n")
+            else:
+                (chip_dir / f"temp{i}_input").write_text(f"{45000 + 1000 * i}\n")
+                (chip_dir / f"temp{i}_max").write_text("84000\n")
+                (chip_dir / f"temp{i}_crit").write_text("100000\n")
+
+
+def make_nvidia_smi_dir(directory: Path, gpus: int, pids: list) -> None:
+    shutil.copytree(FIXTURES / "nvidia-smi" / f"gpu{gpus}", directory)
+    uuids = []
+    for line in (directory / "query-gpu-uuid.csv").read_text().splitlines()[1:]:
+        uuids.append(line.split(",")[1].strip())
+
+    rng = random.Random(0)
+    rows = ["pid, gpu_uuid, used_gpu_memory [MiB]"]
+    for i, pid in enumerate(pids):
+        rows.append(f"{pid}, {uuids[i % gpus]}, {rng.randint(200, 20000)} MiB")
+    (directory / "query-compute-apps.csv").write_text("\n".join(rows) + "\n")
+
+
+###############################################################################
+## Worker (one scenario, fresh interpreter)
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def run_worker(gpus: int, procs: int, ticks: int, alloc_ticks: int) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="lss-bench-"))
+    sleepers = [
+        subprocess.Popen(["sleep", "100000"], stdout=subprocess.DEVNULL)
+        for _ in range(procs)
+    ]
+    try:
+        make_fixture_root(workdir / "root")
+        make_nvidia_smi_dir(workdir / "nvidia-smi", gpus, [p.pid for p in sleepers])
+        os.environ["PATH"] = str(FIXTURES / "bin") + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_NVIDIA_SMI_DIR"] = str(workdir / "nvidia-smi")
+        os.environ["FAKE_USERS_FILE"] = str(workdir / "root" / "users")
+        # the client logs into ./logs
+        os.chdir(workdir)
+
+        sys.argv = [
+            "main.py",
+            "--name",
+            "bench",
+            "--gpu-backend",
+            "nvidia-smi",
+            "--sample-interval",
+            "0",
+            "--spool-dir",
+            str(workdir / "spool"),
+        ]
+        import procfs
+
+        procfs.set_root(workdir / "root")
+        import main
+        from target import Report
+
+        # never reach out to ipify from a benchmark
+        main.NETWORK_COLLECTOR.public_ip.set("203.0.113.1")
+
+        def tick() -> None:
+            status = main.get_status()
+            Report(status).encode(main.TARGETS[0].payload_encoder)
+
+        # warm up: static / slow collectors and the process tracker
+        tick()
+        tick()
+
+        latencies = []
+        cpu_times = []
+        for _ in range(ticks):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            tick()
+            latencies.append(time.perf_counter() - wall_start)
+            cpu_times.append(time.process_time() - cpu_start)
+
+        tracemalloc.start()
+        alloc_peaks = []
+        for _ in range(alloc_ticks):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            tick()
+            _, peak = tracemalloc.get_traced_memory()
+            alloc_peaks.append(peak - base)
+        tracemalloc.stop()
+
+        return dict(
+            gpus=gpus,
+            procs=procs,
+            ticks=ticks,
+            latency_ms_mean=round(sum(latencies) / ticks * 1e3, 3),
+            latency_ms_p50=round(percentile(latencies, 0.5) * 1e3, 3),
+            latency_ms_p95=round(percentile(latencies, 0.95) * 1e3, 3),
+            latency_ms_max=round(max(latencies) * 1e3, 3),
+            cpu_ms_mean=round(sum(cpu_times) / ticks * 1e3, 3),
+            alloc_peak_kib_mean=round(sum(alloc_peaks) / len(alloc_peaks) / 1024, 1),
+            # ru_maxrss is in KiB on Linux
+            peak_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        )
+    finally:
+        for p in sleepers:
+            p.kill()
+            p.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+###############################################################################
+## Driver
+
+
+def git_revision() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=ROOT,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return ""
+
+
+def run_all(ticks: int, alloc_ticks: int) -> dict:
+    results = []
+    for gpus, procs in SCENARIOS:
+        out = subprocess.check_output(
+            [
+                sys.executable,
+                __file__,
+                "--worker",
+                f"--gpus={gpus}",
+                f"--procs={procs}",
+                f"--ticks={ticks}",
+                f"--alloc-ticks={alloc_ticks}",
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+        # the worker prints its JSON result on the last line
+        results.append(json.loads(out.decode().strip().splitlines()[-1]))
+
+    return dict(
+        revision=git_revision(),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+
+
+def print_table(report: dict) -> None:
+    print(f"revision {report['revision'] or '?'}  python {report['python']}")
+    print(
+        f"{'gpus':>4} {'procs':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+        f"{'cpu ms':>8} {'alloc KiB':>10} {'rss KiB':>9}"
+    )
+    for r in report["results"]:
+        print(
+            f"{r['gpus']:>4} {r['procs']:>5} {r['latency_ms_p50']:>8} "
+            f"{r['latency_ms_p95']:>8} {r['latency_ms_max']:>8} {r['cpu_ms_mean']:>8} "
+            f"{r['alloc_peak_kib_mean']:>10} {r['peak_rss_kib']:>9}"
+        )
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    old_by_key = {(r["gpus"], r["procs"]): r for r in old["results"]}
+    print(f"{old['revision'] or old_path} -> {new['revision'] or new_path}")
+    print(f"{'gpus':>4} {'procs':>5} {'p50 ms':>18} {'cpu ms':>18} {'rss KiB':>18}")
+    for r in new["results"]:
+        o = old_by_key.get((r["gpus"], r["procs"]))
+        if o is None:
+            continue
+        cells = []
+        for key in ("latency_ms_p50", "cpu_ms_mean", "peak_rss_kib"):
+            ratio = r[key] / o[key] if o[key] else float("nan")
+            cells.append(f"{o[key]:>7}->{r[key]:<7} x{ratio:.2f}")
+        print(f"{r['gpus']:>4} {r['procs']:>5} " + " ".join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", dest="ticks", type=int, default=50)
+    parser.add_argument("--alloc-ticks", dest="alloc_ticks", type=int, default=5)
+    parser.add_argument("--output", dest="output", help="Write results as JSON")
+    parser.add_argument("--compare", dest="compare", nargs=2, metavar="JSON")
+    parser.add_argument("--worker", dest="worker", action="store_true")
+    parser.add_argument("--gpus", dest="gpus", type=int, default=8)
+    parser.add_argument("--procs", dest="procs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.worker:
+        result = run_worker(args.gpus, args.procs, args.ticks, args.alloc_ticks)
+        print(json.dumps(result))
+        return
+
+    report = run_all(args.ticks, args.alloc_ticks)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    print_table(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Payload size and encode / decode CPU time of the report encodings
+
+Builds a realistic 8-GPU, 20-process MachineStatus and runs it through every
+available (format, compression) pair using the client encoder and the
+server decoder.
+
+Usage:
+    python benchmarks/bench_encoding.py [-n 2000] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "client"))
+sys.path.insert(0, str(ROOT))
+
+from data_model import GPUComputeProcess, GPUStatus, MachineStatus  # noqa: E402
+from encoding import available_formats, compress, encode  # noqa: E402
+
+from server.encoding import CBOR, JSON, MSGPACK, decode, decompress  # noqa: E402
+
+CONTENT_TYPES = {"json": JSON, "msgpack": MSGPACK, "cbor": CBOR}
+
+
+def make_status(gpu_count: int = 8, proc_count: int = 20) -> dict:
+    status = MachineStatus(
+        created_at=datetime.now(),
+        name="3090 x8 Workstation",
+        hostname="gpu-node-01",
+        local_ip="10.0.0.21",
+        public_ip="203.0.113.21",
+        ipv4s=[("lo", "127.0.0.1"), ("eno1", "10.0.0.21"), ("docker0", "172.17.0.1")],
+        ipv6s=[
+            ("lo", "::1"),
+            ("eno1", "fe80::3eec:efff:fe0a:1b2c%eno1"),
+            ("docker0", "fe80::42:5eff:fe9a:7c1d%docker0"),
+        ],
+        architecture="x86_64",
+        mac_address="3c:ec:ef:0a:1b:2c",
+        platform="Linux",
+        platform_release="5.15.0-91-generic",
+        platform_version="#101-Ubuntu SMP Tue Nov 14 13:30:08 UTC 2023",
+        processor="x86_64",
+        uptime=1234567.89,
+        uptime_str="14d 6h 56m",
+        cpu_model="AMD EPYC 7763 64-Core Processor",
+        cpu_cores=128,
+        cpu_usage=0.4231,
+        ram_free=401234.5,
+        ram_total=515880.2,
+        ram_usage=0.22221,
+        gpu_status=[
+            GPUStatus(
+                index=i,
+                gpu_name="NVIDIA GeForce RTX 3090",
+                gpu_usage=0.97,
+                temperature=78.0,
+                memory_free=1234.0,
+                memory_total=24576.0,
+                memory_usage=0.94979,
+            )
+            for i in range(gpu_count)
+        ],
+        gpu_compute_processes=[
+            GPUComputeProcess(
+                pid=200000 + i,
+                user="researcher%02d" % (i % 6),
+                gpu_uuid="GPU-1b2c3d4e-5f60-7182-93a4-b5c6d7e8f9%02d" % (i % gpu_count),
+                gpu_index=i % gpu_count,
+                gpu_mem_used=10240.0,
+                cpu_usage=1.00231,
+                cpu_mem_usage=0.01234,
+                proc_uptime=86400.0 + i,
+                proc_uptime_str="1 day, 0:00:%02d" % i,
+                command="/home/researcher/miniconda3/envs/torch/bin/python -u train.py "
+                "--config configs/vit_large_patch16_384.yaml --batch-size 64 "
+                "--lr 3e-4 --epochs 300 --output /data/runs/exp%03d" % i,
+            )
+            for i in range(proc_count)
+        ],
+        users_info={
+            "all_users": ["researcher%02d" % i for i in range(30)],
+            "online_users": ["researcher%02d" % i for i in range(6)],
+            "offline_users": ["researcher%02d" % i for i in range(6, 30)],
+        },
+    )
+    return dict(status.dict())
+
+
+def bench(obj: dict, fmt: str, compression: str, n: int) -> dict:
+    payload = compress(encode(obj, fmt), compression)
+    content_encoding = "identity" if compression == "none" else compression
+
+    start = time.process_time()
+    for _ in range(n):
+        compress(encode(obj, fmt), compression)
+    encode_us = (time.process_time() - start) / n * 1e6
+
+    start = time.process_time()
+    for _ in range(n):
+        decode(decompress(payload, content_encoding), CONTENT_TYPES[fmt])
+    decode_us = (time.process_time() - start) / n * 1e6
+
+    return dict(
+        format=fmt,
+        compression=compression,
+        bytes=len(payload),
+        encode_us=round(encode_us, 1),
+        decode_us=round(decode_us, 1),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", dest="n", type=int, default=2000)
+    parser.add_argument("--gpus", dest="gpus", type=int, default=8)
+    parser.add_argument("--procs", dest="procs", type=int, default=20)
+    parser.add_argument("--json", dest="json", action="store_true")
+    args = parser.parse_args()
+
+    obj = make_status(args.gpus, args.procs)
+    results = [
+        bench(obj, fmt, compression, args.n)
+        for fmt in available_formats()
+        for compression in ("none", "gzip", "deflate")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = results[0]["bytes"]
+    print(
+        f"{'format':<8} {'compress':<8} {'bytes':>7} {'ratio':>6} {'enc us':>8} {'dec us':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['format']:<8} {r['compression']:<8} {r['bytes']:>7} "
+            f"{r['bytes'] / baseline:>6.2f} {r['encode_us']:>8} {r['decode_us']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Requests per second of GET /get, original vs pre-serialised
+
+Calls the server's ASGI app in-process (middlewares included, no sockets),
+so the numbers are the server's own CPU cost per request on one core. The
+baseline is /get as it used to be: DATA_CACHE returned as a dict, so FastAPI
+runs it through jsonable_encoder and JSONResponse and GZipMiddleware
+compresses it on every request. The "encoded" route re-encodes DATA_CACHE
+on every request with the server's encoder, separating the encoder from the
+caching. The cached one is /get itself, with and without If-None-Match,
+with a status posted every few polls to include re-encoding after
+invalidation, and with a machine filter plus field projection (a GPU
+utilisation dashboard).
+
+Usage:
+    python benchmarks/bench_get.py [--machines 50] [-n 500]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "client"))
+sys.path.insert(0, str(ROOT))
+
+from bench_encoding import make_status  # noqa: E402
+from fastapi import Request  # noqa: E402
+
+import server.main as server  # noqa: E402
+from server.data_model import MachineStatus  # noqa: E402
+from server.encoding import encoded_response  # noqa: E402
+
+GZIP = {"accept-encoding": "gzip"}
+FIELDS = "cpu_usage,ram_usage,gpu_status.gpu_usage"
+
+
+@server.app.get("/get/original")
+async def get_status_original():
+    # the original /get
+    return server.DATA_CACHE
+
+
+@server.app.get("/get/encoded")
+async def get_status_encoded(request: Request):
+    return encoded_response(server.DATA_CACHE, request)
+
+
+async def call(path: str, headers: dict, query: str = "") -> dict:
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 5000),
+    }
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+        else:
+            response["body"] += message.get("body", b"")
+
+    await server.app(scope, receive, send)
+    return response
+
+
+async def bench(
+    path: str, headers: dict, query: str, n: int, change_every: int = 0
+) -> dict:
+    status = dict(server.DATA_CACHE[next(iter(server.DATA_CACHE))])
+    response = await call(path, headers, query)
+    start = time.perf_counter()
+    for i in range(n):
+        if change_every and i % change_every == 0:
+            # what post_status does to the cache
+            server.DATA_CACHE[status["name"]] = dict(status)
+            server.GET_CACHE.invalidate(status["name"])
+        response = await call(path, headers, query)
+    elapsed = time.perf_counter() - start
+    return dict(
+        status=response["status"],
+        bytes=len(response["body"]),
+        requests_per_s=round(n / elapsed),
+        us_per_request=round(elapsed / n * 1e6, 1),
+    )
+
+
+async def run(machines: int, gpus: int, procs: int, n: int) -> list:
+    base = MachineStatus.parse_obj(make_status(gpus, procs))
+    server.DATA_CACHE.clear()
+    for m in range(machines):
+        name = f"Workstation#{m}"
+        server.DATA_CACHE[name] = dict(base.copy(update={"name": name}).dict())
+    server.GET_CACHE.invalidate()
+
+    etag = (await call("/get", {}))["headers"][b"etag"].decode()
+    # the first 5 machines, including the one that changes
+    projected = urlencode(
+        dict(machines=",".join(list(server.DATA_CACHE)[:5]), fields=FIELDS)
+    )
+    scenarios = [
+        ("original", "/get/original", {}, "", 0),
+        ("original gzip", "/get/original", GZIP, "", 0),
+        ("encoded per request", "/get/encoded", {}, "", 0),
+        ("encoded per request gzip", "/get/encoded", GZIP, "", 0),
+        ("cached", "/get", {}, "", 0),
+        ("cached gzip", "/get", GZIP, "", 0),
+        ("cached 304", "/get", {"if-none-match": etag}, "", 0),
+        ("cached gzip, 1 change / 10 polls", "/get", GZIP, "", 10),
+        ("5 machines, 3 fields", "/get", {}, projected, 0),
+        ("5 machines, 3 fields, 1 change / 10", "/get", {}, projected, 10),
+    ]
+    results = []
+    for label, path, headers, query, change_every in scenarios:
+        result = await bench(path, headers, query, n, change_every)
+        results.append(dict(scenario=label, **result))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", dest="n", type=int, default=500)
+    parser.add_argument("--machines", dest="machines", type=int, default=50)
+    parser.add_argument("--gpus", dest="gpus", type=int, default=8)
+    parser.add_argument("--procs", dest="procs", type=int, default=20)
+    parser.add_argument("--json", dest="json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.machines, args.gpus, args.procs, args.n))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<36} {'status':>6} {'bytes':>8} {'req/s':>8} {'us/req':>9}")
+    for r in results:
+        print(
+            f"{r['scenario']:<36} {r['status']:>6} {r['bytes']:>8} "
+            f"{r['requests_per_s']:>8} {r['us_per_request']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Ingest rate and range-query latency of the server's SQLite metric store
+
+Ingest pushes reports from many machines through MetricStore.record() (the
+request path) and waits for the background writer to commit and roll them
+up. Queries run against a store pre-filled with a week of history for every
+machine, laid out as retention leaves it: raw samples for the raw tier's
+retention, 1-minute and 1-hour buckets for the rest.
+
+Usage:
+    python benchmarks/bench_store.py [--machines 100] [--gpus 8] [--days 7]
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from server.data_model import GPUStatus, MachineStatus  # noqa: E402
+from server.history import extract_metrics  # noqa: E402
+from server.store import SCHEMA, TIERS, MetricStore  # noqa: E402
+
+STEP = 5  # seconds between reports of one machine
+QUERY_RANGES = [("1h", 3600), ("24h", 86400), ("7d", 7 * 86400)]
+QUERY_POINTS = 300
+
+
+def make_status(name: str, gpus: int) -> dict:
+    status = MachineStatus(
+        name=name,
+        cpu_usage=0.42,
+        ram_usage=0.22,
+        gpu_status=[
+            GPUStatus(index=i, gpu_usage=0.97, memory_usage=0.95, temperature=78.0)
+            for i in range(gpus)
+        ],
+    )
+    return dict(status.dict())
+
+
+###############################################################################
+## Ingest
+
+
+def bench_ingest(directory: Path, machines: int, gpus: int, ticks: int) -> dict:
+    store = MetricStore(str(directory / "ingest.db"))
+    store.open()
+    statuses = [make_status(f"machine{m:03d}", gpus) for m in range(machines)]
+    start_at = time.time() - ticks * STEP
+
+    enqueue = 0.0
+    start = time.perf_counter()
+    for tick in range(ticks):
+        created_at = datetime.fromtimestamp(start_at + tick * STEP)
+        for status in statuses:
+            status = dict(status, created_at=created_at)
+            t = time.perf_counter()
+            store.record(status["name"], status)
+            store.save(status["name"], status)
+            enqueue += time.perf_counter() - t
+    store.flush()
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    reports = machines * ticks
+    samples = reports * len(extract_metrics(statuses[0]))
+    return dict(
+        reports=reports,
+        samples=samples,
+        seconds=round(elapsed, 2),
+        reports_per_s=round(reports / elapsed),
+        samples_per_s=round(samples / elapsed),
+        enqueue_us=round(enqueue / reports * 1e6, 2),
+    )
+
+
+###############################################################################
+## Queries
+
+
+def fill_week(path: Path, machines: int, gpus: int, days: int) -> dict:
+    """
+    Write `days` of history for every machine straight into the tables
+    """
+    now = int(time.time())
+    metrics = sorted(extract_metrics(make_status("", gpus)))
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO series (machine, metric) VALUES (?, ?)",
+        [(f"machine{m:03d}", metric) for m in range(machines) for metric in metrics],
+    )
+    series_ids = [row[0] for row in conn.execute("SELECT id FROM series")]
+    rng = np.random.default_rng(0)
+
+    rows = {}
+    start = time.perf_counter()
+    for tier, (table, bucket, retention) in TIERS.items():
+        span = min(retention, days * 86400)
+        step = STEP if tier == "raw" else bucket
+        ts = np.arange(now - span, now, step, dtype=np.int64)
+        ts -= ts % step
+        for series in series_ids:
+            values = rng.random(len(ts))
+            if tier == "raw":
+                data = zip([series] * len(ts), ts.tolist(), values.tolist())
+                conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?)", data)
+            else:
+                count = bucket // STEP
+                data = zip(
+                    [series] * len(ts),
+                    ts.tolist(),
+                    [count] * len(ts),
+                    (values * count).tolist(),
+                    (values * 0.5).tolist(),
+                    (values * 0.5 + 0.5).tolist(),
+                )
+                conn.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?)", data)
+        rows[tier] = len(ts) * len(series_ids)
+    conn.execute("COMMIT")
+    conn.close()
+    return dict(rows=rows, fill_seconds=round(time.perf_counter() - start, 1))
+
+
+def bench_queries(path: Path, machines: int, repeat: int) -> list:
+    store = MetricStore(str(path))
+    results = []
+    for label, span in QUERY_RANGES:
+        latencies = []
+        tier = None
+        for _ in range(repeat):
+            name = f"machine{random.randrange(machines):03d}"
+            end = time.time()
+            start = end - span
+            t = time.perf_counter()
+            result = store.query(name, None, start, end, span / QUERY_POINTS)
+            latencies.append((time.perf_counter() - t) * 1000)
+            tier = result["tier"]
+        latencies.sort()
+        results.append(
+            dict(
+                range=label,
+                tier=tier,
+                metrics=len(result["metrics"]),
+                points=len(result["timestamps"]),
+                p50_ms=round(statistics.median(latencies), 2),
+                p95_ms=round(latencies[int(len(latencies) * 0.95) - 1], 2),
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--machines", dest="machines", type=int, default=100)
+    parser.add_argument("--gpus", dest="gpus", type=int, default=8)
+    parser.add_argument("--days", dest="days", type=int, default=7)
+    parser.add_argument("--ticks", dest="ticks", type=int, default=120)
+    parser.add_argument("--repeat", dest="repeat", type=int, default=50)
+    parser.add_argument("--dir", dest="dir", help="Keep the databases here")
+    parser.add_argument("--json", dest="json", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(args.dir or tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        ingest = bench_ingest(directory, args.machines, args.gpus, args.ticks)
+        week = directory / "week.db"
+        if not week.exists():
+            fill = fill_week(week, args.machines, args.gpus, args.days)
+        else:
+            fill = None
+        queries = bench_queries(week, args.machines, args.repeat)
+        size = sum(p.stat().st_size for p in directory.glob("week.db*"))
+
+    if args.json:
+        print(json.dumps(dict(ingest=ingest, fill=fill, queries=queries), indent=2))
+        return
+
+    print(
+        f"ingest: {ingest['reports']} reports / {ingest['samples']} samples "
+        f"in {ingest['seconds']} s: {ingest['reports_per_s']} reports/s, "
+        f"{ingest['samples_per_s']} samples/s, {ingest['enqueue_us']} us "
+        "per report on the request path"
+    )
+    if fill is not None:
+        print(f"week: {fill['rows']} rows, written in {fill['fill_seconds']} s")
+    print(f"week: {size / 1024 ** 2:.0f} MiB on disk")
+    print(
+        f"{'range':<6} {'tier':<5} {'metrics':>7} {'points':>6} {'p50 ms':>8} {'p95 ms':>8}"
+    )
+    for r in queries:
+        print(
+            f"{r['range']:<6} {r['tier']:<5} {r['metrics']:>7} {r['points']:>6} "
+            f"{r['p50_ms']:>8} {r['p95_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import pwd
+import time
+from logging import INFO
+from typing import Dict, List, Optional, Tuple
+
+import procfs
+from puts import get_logger
+from users import PasswdCache
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+MiB = 1024.0**2
+STAT_READ_SIZE = 1024  # /proc/<pid>/stat is a single short line
+
+
+###############################################################################
+## /proc Scan
+
+
+def parse_pid_stat(data: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    (cpu ticks, start time, rss pages) from the content of /proc/<pid>/stat
+    """
+    # the command name (field 2) may contain spaces and parentheses
+    fields = data[data.rfind(b")") + 2 :].split()
+    if len(fields) < 22:
+        return None
+    # fields 14 / 15 (utime / stime), 22 (starttime), 24 (rss)
+    return int(fields[11]) + int(fields[12]), int(fields[19]), int(fields[21])
+
+
+def scan_processes(
+    known: Dict[Tuple[int, int], Tuple[int, int, int]] = None,
+) -> Dict[Tuple[int, int], Tuple[int, int, int]]:
+    """
+    (pid, start time) -> (uid, cpu ticks, rss pages) for every process
+
+    One directory scan plus one read per process. The owner is taken from
+    the stat of the /proc/<pid> directory, only for processes that are not
+    in `known` (the previous scan).
+    """
+    known = known or {}
+    processes = {}
+    with os.scandir(procfs.PROC_ROOT) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            # raw os calls on string paths: this runs for thousands of pids
+            # per tick, open() / pathlib would double the cost of the scan
+            try:
+                fd = os.open(entry.path + "/stat", os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                data = os.read(fd, STAT_READ_SIZE)
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+            stat = parse_pid_stat(data)
+            if stat is None:
+                continue
+            cpu_ticks, start_time, rss = stat
+            key = (int(entry.name), start_time)
+            previous = known.get(key)
+            if previous is not None:
+                uid = previous[0]
+            else:
+                try:
+                    uid = entry.stat().st_uid
+                except OSError:
+                    continue
+            processes[key] = (uid, cpu_ticks, rss)
+    return processes
+
+
+###############################################################################
+## Collector
+
+
+class UserAccounting:
+    """
+    CPU, RAM and process count per user, from one /proc scan per tick
+
+    CPU usage is the sum of the CPU time deltas of the user's processes since
+    the previous scan, as a fraction of the whole machine (same range as
+    MachineStatus.cpu_usage); processes are keyed by (pid, start time) so a
+    recycled PID is not mistaken for the old process. A process changing its
+    uid with setuid() keeps being counted for its original owner. Processes
+    that started since the previous scan count with their whole CPU time.
+    The first scan only primes the counters, so it reports no CPU usage.
+    """
+
+    def __init__(self, passwd: PasswdCache = None):
+        self.passwd = passwd or PasswdCache()
+        self.cpu_count = os.cpu_count() or 1
+        self._last: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+        self._last_at: Optional[float] = None
+        # uids that are not in /etc/passwd (e.g. LDAP), resolved once each
+        self._nss_names: Dict[int, str] = {}
+
+    def _user_name(self, uid: int) -> str:
+        name = self.passwd.uid_names.get(uid)
+        if name is not None:
+            return name
+        name = self._nss_names.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self._nss_names[uid] = name
+        return name
+
+    def collect(self) -> List[dict]:
+        self.passwd.refresh()
+        now = time.monotonic()
+        last, last_at = self._last, self._last_at
+        processes = scan_processes(known=last)
+        self._last, self._last_at = processes, now
+
+        # uid -> [processes, cpu ticks, rss pages]
+        totals: Dict[int, List[int]] = {}
+        for key, (uid, cpu_ticks, rss) in processes.items():
+            total = totals.get(uid)
+            if total is None:
+                total = totals[uid] = [0, 0, 0]
+            total[0] += 1
+            previous = last.get(key)
+            total[1] += cpu_ticks - previous[1] if previous else cpu_ticks
+            total[2] += rss
+
+        elapsed = now - last_at if last_at is not None else None
+        table = []
+        for uid, (count, cpu_ticks, rss) in totals.items():
+            cpu_usage = None
+            if elapsed:
+                # clock tick granularity can overshoot on short intervals
+                cpu_usage = cpu_ticks / CLK_TCK / elapsed / self.cpu_count
+                cpu_usage = round(min(cpu_usage, 1.0), 5)
+            table.append(
+                dict(
+                    user=self._user_name(uid),
+                    processes=count,
+                    cpu_usage=cpu_usage,
+                    ram_used=round(rss * PAGE_SIZE / MiB, 1),
+                )
+            )
+
+        # heaviest users first
+        table.sort(
+            key=lambda row: (row["cpu_usage"] or 0, row["ram_used"]), reverse=True
+        )
+        return table
+
+
+def add_gpu_memory(table: List[dict], gpu_compute_processes: list) -> List[dict]:
+    """
+    Join the GPU memory held by each user's compute processes into the table
+    """
+    gpu_mem: Dict[str, float] = {}
+    for gpu_proc in gpu_compute_processes:
+        if gpu_proc.user and gpu_proc.gpu_mem_used is not None:
+            gpu_mem[gpu_proc.user] = (
+                gpu_mem.get(gpu_proc.user, 0) + gpu_proc.gpu_mem_used
+            )
+
+    return [dict(row, gpu_mem_used=gpu_mem.get(row["user"], 0.0)) for row in table]
@@ -36,6 +36,16 @@ from pydantic import BaseModel, validator
 #         return v or datetime.now()
 
 
+class MetricSummary(BaseModel):
+    """Statistics of the samples taken since the previous report"""
+
+    min: float = None
+    mean: float = None
+    max: float = None
+    p95: float = None
+    samples: int = None
+
+
 class GPUStatus(BaseModel):
     index: int = None
     gpu_name: str = None
@@ -44,6 +54,10 @@ class GPUStatus(BaseModel):
     memory_free: float = None  # MB
     memory_total: float = None  # MB
     memory_usage: float = None  # range: [0, 1]
+    # high-frequency sampling summaries
+    gpu_usage_stats: MetricSummary = None
+    memory_usage_stats: MetricSummary = None
+    temperature_stats: MetricSummary = None
 
 
 class GPUComputeProcess(BaseModel):
@@ -60,6 +74,89 @@ class GPUComputeProcess(BaseModel):
     command: str = None
 
 
+class DiskRates(BaseModel):
+    """I/O of one disk since the previous report"""
+
+    name: str = None
+    read_bytes_rate: float = None  # bytes/s
+    write_bytes_rate: float = None  # bytes/s
+    read_iops: float = None
+    write_iops: float = None
+    busy: float = None  # range: [0, 1], fraction of time with I/O in flight
+
+
+class FilesystemUsage(BaseModel):
+    mount_point: str = None
+    device: str = None
+    fstype: str = None  # e.g. ext4, nfs4
+    total: float = None  # MB
+    used: float = None  # MB
+    free: float = None  # MB, available to non-root users
+    usage: float = None  # range: [0, 1]
+
+
+class TemperatureSensor(BaseModel):
+    chip: str = None  # hwmon driver, e.g. coretemp, k10temp, nvme
+    label: str = None  # e.g. Package id 0, Tctl, Composite
+    temperature: float = None  # Celsius
+    high: float = None  # Celsius
+    critical: float = None  # Celsius
+
+
+class FanSensor(BaseModel):
+    chip: str = None
+    label: str = None
+    rpm: int = None
+
+
+class InterfaceRates(BaseModel):
+    """Throughput of one network interface since the previous report"""
+
+    name: str = None
+    rx_bytes_rate: float = None  # bytes/s
+    tx_bytes_rate: float = None  # bytes/s
+    rx_packets_rate: float = None  # packets/s
+    tx_packets_rate: float = None  # packets/s
+
+
+class SectionTiming(BaseModel):
+    """Rolling timings of one instrumented section of the agent"""
+
+    count: int = None
+    wall_mean: float = None  # seconds
+    wall_p95: float = None  # seconds
+    wall_max: float = None  # seconds
+    wall_buckets: List[int] = None  # counts per 1/5/10/50/100/500ms/1/5s/+inf
+    cpu_mean: float = None  # seconds
+    subprocesses_mean: float = None
+
+
+class UserSession(BaseModel):
+    user: str = None
+    sessions: int = None  # number of login sessions
+    idle: float = None  # seconds since the last input on any of them
+
+
+class UserUsage(BaseModel):
+    """Resources used by all processes of one user"""
+
+    user: str = None
+    processes: int = None
+    cpu_usage: float = None  # range: [0, 1] of the whole machine
+    ram_used: float = None  # MB, resident
+    gpu_mem_used: float = None  # MB
+
+
+class AgentStats(BaseModel):
+    """The reporting agent's own timings"""
+
+    tick: int = None  # tick number since the agent started
+    collection_time: float = None  # seconds spent in get_status()
+    send_time: float = None  # seconds spent sending the previous report
+    missed_ticks: int = None  # ticks skipped since the previous report
+    profile: Dict[str, SectionTiming] = None  # only with --profile
+
+
 class MachineStatus(BaseModel):
     created_at: datetime = None
     name: str = None
@@ -69,6 +166,7 @@ class MachineStatus(BaseModel):
     public_ip: str = None
     ipv4s: list = None
     ipv6s: list = None
+    net_interfaces: List[InterfaceRates] = None
     # sys info
     architecture: str = None
     mac_address: str = None
@@ -85,11 +183,26 @@ class MachineStatus(BaseModel):
     ram_free: float = None  # MB
     ram_total: float = None  # MB
     ram_usage: float = None  # range: [0, 1]
+    cpu_usage_stats: MetricSummary = None
+    ram_usage_stats: MetricSummary = None
+    # storage
+    disks: List[DiskRates] = None
+    filesystems: List[FilesystemUsage] = None
+    # thermal
+    cpu_temperature: float = None  # Celsius, hottest CPU sensor
+    temperatures: List[TemperatureSensor] = None
+    fans: List[FanSensor] = None
     # gpu usage
     gpu_status: List[GPUStatus] = None
     gpu_compute_processes: List[GPUComputeProcess] = None
     # users info
     users_info: Dict[str, List[str]] = None
+    user_sessions: List[UserSession] = None
+    user_usage: List[UserUsage] = None
+    # collectors that missed their deadline (values are from a previous tick)
+    stale_collectors: List[str] = None
+    # agent self-metrics
+    agent_stats: AgentStats = None
 
     @validator("created_at", pre=True, always=True)
     def default_created_at(cls, v):
@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# send a full baseline at least every N reports, even without a sequence gap
+FULL_RESYNC_EVERY = 120
+
+# list fields patched item by item, with the fields that identify an item
+ITEM_KEYS: Dict[str, Tuple[str, ...]] = {
+    "net_interfaces": ("name",),
+    "disks": ("name",),
+    "filesystems": ("mount_point",),
+    "temperatures": ("chip", "label"),
+    "fans": ("chip", "label"),
+    "gpu_status": ("index",),
+    "gpu_compute_processes": ("pid", "gpu_index"),
+}
+
+
+def diff_items(
+    previous: List[Any], current: List[Any], key: Tuple[str, ...]
+) -> Optional[Dict[str, Any]]:
+    """
+    An item patch of `current` against `previous`:
+
+        {"key": ["pid", "gpu_index"], "items": [{"pid": 7, "gpu_index": 0,
+                                                 "cpu_usage": 0.93}, ...]}
+
+    Items come in the order of `current`, each reduced to its key and the
+    fields that changed (new items whole, removed items left out). None if
+    the items cannot be told apart by `key`: the list is then sent whole.
+    """
+    known: Dict[tuple, dict] = {}
+    for item in previous:
+        if not isinstance(item, dict):
+            return None
+        known[tuple(item.get(field) for field in key)] = item
+    if len(known) != len(previous):
+        return None
+
+    items = []
+    seen = set()
+    for item in current:
+        if not isinstance(item, dict):
+            return None
+        item_key = tuple(item.get(field) for field in key)
+        if item_key in seen:
+            return None
+        seen.add(item_key)
+        before = known.get(item_key)
+        if before is None:
+            items.append(item)
+            continue
+        changed = {field: item.get(field) for field in key}
+        for field, value in item.items():
+            if field not in before or before[field] != value:
+                changed[field] = value
+        items.append(changed)
+    return {"key": list(key), "items": items}
+
+
+class DeltaEncoder:
+    """
+    Turn successive status dicts into a full baseline followed by patches
+
+    Each report carries a sequence number. The first report (and every
+    report after reset()) is a full baseline:
+
+        {"name": ..., "seq": 7, "full": {...}}
+
+    later ones only carry the top-level fields whose value changed:
+
+        {"name": ..., "seq": 8, "patch": {"cpu_usage": 0.31, ...}}
+
+    and the lists in ITEM_KEYS only their changed items and fields (see
+    diff_items), so a running job's command line is sent once, not every
+    time its CPU usage moves.
+
+    The server applies a patch only if it holds seq - 1; otherwise it asks
+    for a resync, and the caller should reset() the encoder.
+    """
+
+    def __init__(self, name: str, full_resync_every: int = FULL_RESYNC_EVERY):
+        self.name = name
+        self.full_resync_every = full_resync_every
+        self.seq = 0
+        self.since_full = 0
+        self.last_sent: Optional[Dict[str, Any]] = None
+
+    def reset(self) -> None:
+        """
+        Force the next report to be a full baseline
+        """
+        self.last_sent = None
+
+    def encode(self, status: Dict[str, Any]) -> Dict[str, Any]:
+        self.seq += 1
+
+        if self.last_sent is None or self.since_full >= self.full_resync_every:
+            report = {"name": self.name, "seq": self.seq, "full": status}
+            self.since_full = 0
+        else:
+            patch = {}
+            for field, value in status.items():
+                if field in self.last_sent:
+                    previous = self.last_sent[field]
+                    if previous == value:
+                        continue
+                    key = ITEM_KEYS.get(field)
+                    if key and isinstance(previous, list) and isinstance(value, list):
+                        value = diff_items(previous, value, key) or value
+                patch[field] = value
+            report = {"name": self.name, "seq": self.seq, "patch": patch}
+            self.since_full += 1
+
+        self.last_sent = status
+        return report
@@ -0,0 +1,105 @@
+import gzip
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Tuple
+
+from puts import json_serial
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional
+    cbor2 = None
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "cbor": "application/cbor",
+}
+
+
+def _primitive(obj: Any) -> Any:
+    # cbor2 refuses naive datetimes, send them as ISO strings like JSON does
+    if isinstance(obj, dict):
+        return {k: _primitive(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_primitive(v) for v in obj]
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return obj
+
+
+def available_formats() -> list:
+    formats = ["json"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    if cbor2 is not None:
+        formats.append("cbor")
+    return formats
+
+
+def encode(obj: Any, fmt: str = "json") -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(obj, default=json_serial)
+    if fmt == "cbor":
+        return cbor2.dumps(_primitive(obj))
+    return json.dumps(obj, default=json_serial).encode("utf-8")
+
+
+def compress(data: bytes, compression: str = "none") -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "deflate":
+        return zlib.compress(data, 6)
+    return data
+
+
+class PayloadEncoder:
+    """
+    Encode report bodies and build the matching Content-Type/-Encoding headers
+
+    After the server rejects a body with 415 Unsupported Media Type, call
+    fallback() to go back to plain JSON for the rest of the session.
+    """
+
+    def __init__(self, fmt: str = "json", compression: str = "none"):
+        if fmt not in available_formats():
+            raise ValueError(f"Payload format '{fmt}' is not available")
+        self.fmt = fmt
+        self.compression = compression
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "Content-type": CONTENT_TYPES[self.fmt],
+            "Accept": "application/json",
+        }
+        if self.compression != "none":
+            headers["Content-Encoding"] = self.compression
+        return headers
+
+    def encode(self, obj: Any) -> bytes:
+        return compress(encode(obj, self.fmt), self.compression)
+
+    def encode_json(self, body: bytes) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Compress an already JSON-encoded body, returns (data, headers)
+        """
+        headers = {"Content-type": CONTENT_TYPES["json"], "Accept": "application/json"}
+        if self.compression != "none":
+            headers["Content-Encoding"] = self.compression
+        return compress(body, self.compression), headers
+
+    def fallback(self) -> bool:
+        """
+        Switch to uncompressed JSON; returns False if already using it
+        """
+        if self.fmt == "json" and self.compression == "none":
+            return False
+        self.fmt = "json"
+        self.compression = "none"
+        return True
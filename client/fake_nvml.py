@@ -0,0 +1,114 @@
+"""
+A minimal in-memory stand-in for the pynvml module
+
+Implements just the subset of the pynvml API used by gpu.NVMLBackend, so the
+NVML code path can be exercised and benchmarked on a machine without a GPU:
+
+    backend = NVMLBackend(nvml=FakeNVML(gpu_count=8, procs_per_gpu=3))
+"""
+
+import random
+from collections import namedtuple
+from typing import Dict, List
+
+NVML_TEMPERATURE_GPU = 0
+
+Memory = namedtuple("Memory", ["total", "free", "used"])
+Utilization = namedtuple("Utilization", ["gpu", "memory"])
+ProcessInfo = namedtuple("ProcessInfo", ["pid", "usedGpuMemory"])
+
+MiB = 1024**2
+
+
+class NVMLError(Exception):
+    pass
+
+
+class FakeNVML:
+    NVML_TEMPERATURE_GPU = NVML_TEMPERATURE_GPU
+    NVMLError = NVMLError
+
+    def __init__(
+        self,
+        gpu_count: int = 4,
+        gpu_name: str = "NVIDIA GeForce RTX 3090",
+        memory_total: int = 24576,  # MiB
+        procs_per_gpu: int = 2,
+        first_pid: int = 100000,
+        seed: int = 0,
+    ):
+        self.gpu_count = gpu_count
+        self.gpu_name = gpu_name
+        self.memory_total = memory_total * MiB
+        self.random = random.Random(seed)
+        self.initialized = False
+        # number of calls per API function, handy for asserting caching
+        self.calls: Dict[str, int] = {}
+
+        self.processes: List[List[ProcessInfo]] = []
+        pid = first_pid
+        for _ in range(gpu_count):
+            procs = []
+            for _ in range(procs_per_gpu):
+                procs.append(ProcessInfo(pid, 1024 * MiB))
+                pid += 1
+            self.processes.append(procs)
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _check(self, handle: int = 0) -> None:
+        if not self.initialized:
+            raise NVMLError("NVML not initialized")
+        if not 0 <= handle < self.gpu_count:
+            raise NVMLError("Invalid argument")
+
+    def nvmlInit(self) -> None:
+        self._count("nvmlInit")
+        self.initialized = True
+
+    def nvmlShutdown(self) -> None:
+        self._count("nvmlShutdown")
+        self.initialized = False
+
+    def nvmlDeviceGetCount(self) -> int:
+        self._count("nvmlDeviceGetCount")
+        self._check()
+        return self.gpu_count
+
+    def nvmlDeviceGetHandleByIndex(self, index: int) -> int:
+        self._count("nvmlDeviceGetHandleByIndex")
+        self._check(index)
+        return index
+
+    def nvmlDeviceGetName(self, handle: int) -> str:
+        self._count("nvmlDeviceGetName")
+        self._check(handle)
+        return self.gpu_name
+
+    def nvmlDeviceGetUUID(self, handle: int) -> str:
+        self._count("nvmlDeviceGetUUID")
+        self._check(handle)
+        return f"GPU-00000000-0000-0000-0000-{handle:012d}"
+
+    def nvmlDeviceGetMemoryInfo(self, handle: int) -> Memory:
+        self._count("nvmlDeviceGetMemoryInfo")
+        self._check(handle)
+        used = sum(p.usedGpuMemory for p in self.processes[handle])
+        used = min(used, self.memory_total)
+        return Memory(self.memory_total, self.memory_total - used, used)
+
+    def nvmlDeviceGetUtilizationRates(self, handle: int) -> Utilization:
+        self._count("nvmlDeviceGetUtilizationRates")
+        self._check(handle)
+        return Utilization(self.random.randint(0, 100), self.random.randint(0, 100))
+
+    def nvmlDeviceGetTemperature(self, handle: int, sensor: int) -> int:
+        self._count("nvmlDeviceGetTemperature")
+        self._check(handle)
+        return self.random.randint(30, 85)
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle: int) -> List[ProcessInfo]:
+        self._count("nvmlDeviceGetComputeRunningProcesses")
+        self._check(handle)
+        return list(self.processes[handle])
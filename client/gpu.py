@@ -0,0 +1,301 @@
+import asyncio
+import shlex
+import subprocess
+from logging import INFO
+from typing import Dict, List
+
+from data_model import GPUComputeProcess, GPUStatus
+from puts import get_logger
+from scheduler import to_thread
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+MiB = 1024.0**2
+NVIDIA_SMI_TIMEOUT = 10  # seconds
+
+
+###############################################################################
+## nvidia-smi Backend
+
+
+def _run_nvidia_smi(cmd: str) -> List[List[str]]:
+    """
+    Run a nvidia-smi query and return the CSV rows without the header
+    """
+    try:
+        completed_proc = subprocess.run(
+            shlex.split(cmd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=NVIDIA_SMI_TIMEOUT,
+        )
+    except FileNotFoundError:
+        return []
+    except subprocess.TimeoutExpired:
+        logger.error(f"nvidia-smi timed out after {NVIDIA_SMI_TIMEOUT}s")
+        return []
+
+    if completed_proc.returncode != 0:
+        return []
+
+    return _parse_csv(completed_proc.stdout)
+
+
+async def _run_nvidia_smi_async(cmd: str) -> List[List[str]]:
+    """
+    Same as _run_nvidia_smi, through an asyncio subprocess
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *shlex.split(cmd),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except FileNotFoundError:
+        return []
+
+    try:
+        stdout, _ = await asyncio.wait_for(
+            proc.communicate(), timeout=NVIDIA_SMI_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"nvidia-smi timed out after {NVIDIA_SMI_TIMEOUT}s")
+        proc.kill()
+        await proc.wait()
+        return []
+
+    if proc.returncode != 0:
+        return []
+
+    return _parse_csv(stdout)
+
+
+def _parse_csv(output: bytes) -> List[List[str]]:
+    lines = output.decode("utf-8").strip().split("\n")
+    if len(lines) <= 1:
+        return []
+
+    return [row.split(",") for row in lines[1:]]
+
+
+class NvidiaSmiBackend:
+    """
+    Query GPUs by shelling out to nvidia-smi (one process launch per query)
+    """
+
+    name = "nvidia-smi"
+
+    GPU_STATUS_CMD = "nvidia-smi --query-gpu=index,gpu_name,utilization.gpu,temperature.gpu,memory.total,memory.used,memory.free --format=csv"
+    UUID_INDEX_CMD = "nvidia-smi --query-gpu=index,uuid --format=csv"
+    COMPUTE_APPS_CMD = (
+        "nvidia-smi --query-compute-apps=pid,gpu_uuid,used_gpu_memory --format=csv"
+    )
+
+    def gpu_status(self) -> List[GPUStatus]:
+        return self._parse_gpu_status(_run_nvidia_smi(self.GPU_STATUS_CMD))
+
+    async def gpu_status_async(self) -> List[GPUStatus]:
+        return self._parse_gpu_status(await _run_nvidia_smi_async(self.GPU_STATUS_CMD))
+
+    @staticmethod
+    def _parse_gpu_status(rows: List[List[str]]) -> List[GPUStatus]:
+        gpu_status_list: List[GPUStatus] = []
+        for row in rows:
+            if len(row) != 7:
+                continue
+            gpu_status = GPUStatus()
+            gpu_status.index = row[0].strip()
+            gpu_status.gpu_name = row[1].strip()
+            gpu_status.gpu_usage = float(row[2].strip("% ")) / 100
+            gpu_status.temperature = float(row[3].strip())
+            gpu_status.memory_total = float(row[4].strip(" MiB"))
+            gpu_mem_used = float(row[5].strip(" MiB"))
+            gpu_status.memory_free = float(row[6].strip(" MiB"))
+            # compute used memory percentage
+            # value returned by utilization.memory is not accurate
+            gpu_status.memory_usage = round(gpu_mem_used / gpu_status.memory_total, 5)
+            gpu_status_list.append(gpu_status)
+
+        return gpu_status_list
+
+    def uuid_index_map(self) -> Dict[str, int]:
+        return self._parse_uuid_index_map(_run_nvidia_smi(self.UUID_INDEX_CMD))
+
+    @staticmethod
+    def _parse_uuid_index_map(rows: List[List[str]]) -> Dict[str, int]:
+        gpu_uuid_index_map: Dict[str, int] = {}
+        for row in rows:
+            if len(row) != 2:
+                continue
+            gpu_uuid_index_map[row[1].strip()] = int(row[0].strip())
+
+        return gpu_uuid_index_map
+
+    def compute_processes(self) -> List[GPUComputeProcess]:
+        rows = _run_nvidia_smi(self.COMPUTE_APPS_CMD)
+        if not rows:
+            return []
+
+        return self._parse_compute_processes(rows, self.uuid_index_map())
+
+    async def compute_processes_async(self) -> List[GPUComputeProcess]:
+        rows = await _run_nvidia_smi_async(self.COMPUTE_APPS_CMD)
+        if not rows:
+            return []
+
+        gpu_uuid_index_map = self._parse_uuid_index_map(
+            await _run_nvidia_smi_async(self.UUID_INDEX_CMD)
+        )
+        return self._parse_compute_processes(rows, gpu_uuid_index_map)
+
+    @staticmethod
+    def _parse_compute_processes(
+        rows: List[List[str]], gpu_uuid_index_map: Dict[str, int]
+    ) -> List[GPUComputeProcess]:
+        gpu_compute_processes: List[GPUComputeProcess] = []
+        for row in rows:
+            if len(row) != 3:
+                continue
+            gpu_proc = GPUComputeProcess()
+            gpu_proc.pid = int(row[0].strip())
+            gpu_proc.gpu_uuid = row[1].strip()
+            gpu_proc.gpu_index = gpu_uuid_index_map.get(gpu_proc.gpu_uuid, -1)
+            gpu_proc.gpu_mem_used = float(row[2].strip(" MiB"))
+            gpu_compute_processes.append(gpu_proc)
+
+        return gpu_compute_processes
+
+    def close(self) -> None:
+        pass
+
+
+###############################################################################
+## NVML Backend
+
+
+class NVMLBackend:
+    """
+    Query GPUs in-process through NVML
+
+    One NVML session is kept for the life of the agent. Static per-GPU data
+    (name, UUID, total memory) is read once at init; only the dynamic
+    counters are queried on each call.
+
+    `nvml` is any object exposing the pynvml API, which allows a fake to be
+    plugged in (see fake_nvml.py).
+    """
+
+    name = "nvml"
+
+    def __init__(self, nvml=None):
+        if nvml is None:
+            import pynvml as nvml
+
+        self.nvml = nvml
+        self.nvml.nvmlInit()
+
+        self.handles = []
+        self.gpu_names: List[str] = []
+        self.memory_totals: List[float] = []  # MiB
+        self.gpu_uuid_index_map: Dict[str, int] = {}
+
+        for index in range(self.nvml.nvmlDeviceGetCount()):
+            handle = self.nvml.nvmlDeviceGetHandleByIndex(index)
+            self.handles.append(handle)
+            self.gpu_names.append(_to_str(self.nvml.nvmlDeviceGetName(handle)))
+            self.memory_totals.append(
+                self.nvml.nvmlDeviceGetMemoryInfo(handle).total / MiB
+            )
+            gpu_uuid = _to_str(self.nvml.nvmlDeviceGetUUID(handle))
+            self.gpu_uuid_index_map[gpu_uuid] = index
+
+        self.gpu_uuids = list(self.gpu_uuid_index_map.keys())
+
+    def gpu_status(self) -> List[GPUStatus]:
+        gpu_status_list: List[GPUStatus] = []
+        for index, handle in enumerate(self.handles):
+            utilization = self.nvml.nvmlDeviceGetUtilizationRates(handle)
+            temperature = self.nvml.nvmlDeviceGetTemperature(
+                handle, self.nvml.NVML_TEMPERATURE_GPU
+            )
+            mem = self.nvml.nvmlDeviceGetMemoryInfo(handle)
+            memory_total = self.memory_totals[index]
+
+            gpu_status = GPUStatus()
+            gpu_status.index = index
+            gpu_status.gpu_name = self.gpu_names[index]
+            gpu_status.gpu_usage = utilization.gpu / 100
+            gpu_status.temperature = float(temperature)
+            gpu_status.memory_total = memory_total
+            gpu_status.memory_free = mem.free / MiB
+            gpu_status.memory_usage = round((mem.used / MiB) / memory_total, 5)
+            gpu_status_list.append(gpu_status)
+
+        return gpu_status_list
+
+    async def gpu_status_async(self) -> List[GPUStatus]:
+        # in-process, but a driver call can still block: keep it off the loop
+        return await to_thread(self.gpu_status)
+
+    def uuid_index_map(self) -> Dict[str, int]:
+        return self.gpu_uuid_index_map
+
+    def compute_processes(self) -> List[GPUComputeProcess]:
+        gpu_compute_processes: List[GPUComputeProcess] = []
+        for index, handle in enumerate(self.handles):
+            for p in self.nvml.nvmlDeviceGetComputeRunningProcesses(handle):
+                gpu_proc = GPUComputeProcess()
+                gpu_proc.pid = p.pid
+                gpu_proc.gpu_uuid = self.gpu_uuids[index]
+                gpu_proc.gpu_index = index
+                # usedGpuMemory is None when not available (e.g. on Windows WDDM)
+                if p.usedGpuMemory is not None:
+                    gpu_proc.gpu_mem_used = p.usedGpuMemory / MiB
+                gpu_compute_processes.append(gpu_proc)
+
+        return gpu_compute_processes
+
+    async def compute_processes_async(self) -> List[GPUComputeProcess]:
+        return await to_thread(self.compute_processes)
+
+    def close(self) -> None:
+        try:
+            self.nvml.nvmlShutdown()
+        except Exception as e:
+            logger.error(e)
+
+
+def _to_str(value) -> str:
+    # older pynvml releases return bytes
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+###############################################################################
+## Backend Selection
+
+
+def get_gpu_backend(preferred: str = "auto"):
+    """
+    Pick a GPU backend: "auto" | "nvml" | "nvidia-smi" | "fake"
+
+    "auto" uses NVML when pynvml is installed and a driver is present, and
+    falls back to nvidia-smi otherwise.
+    """
+    if preferred == "nvidia-smi":
+        return NvidiaSmiBackend()
+
+    if preferred == "fake":
+        from fake_nvml import FakeNVML
+
+        return NVMLBackend(nvml=FakeNVML())
+
+    try:
+        return NVMLBackend()
+    except Exception as e:
+        if preferred == "nvml":
+            raise
+        logger.info(f"NVML unavailable ({e!r}), falling back to nvidia-smi")
+        return NvidiaSmiBackend()
@@ -1,22 +1,35 @@
 import argparse
-import datetime
-import json
-import platform
-import re
-import shlex
-import socket
-import subprocess
+import asyncio
+import os
+import signal
+import threading
 import time
-import uuid
 from logging import INFO
 from pathlib import Path
-from time import sleep
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import gpu
+import procfs
 import psutil
-import requests
-from data_model import GPUComputeProcess, GPUStatus, MachineStatus
-from puts import get_logger, json_serial
+from accounting import UserAccounting, add_gpu_memory
+from data_model import AgentStats, GPUComputeProcess, GPUStatus, MachineStatus
+from network import NetworkCollector
+from proc_tracker import ProcessTracker
+from profiling import Profiler
+from puts import get_logger
+from sampler import Sampler
+from scheduler import (
+    ONCE,
+    AsyncCollectorScheduler,
+    Collector,
+    CollectorScheduler,
+    Ticker,
+    to_thread,
+)
+from storage import DiskCollector, filesystem_usage
+from thermal import ThermalCollector
+from target import Report, Target, make_targets
+from users import UsersCollector
 
 logger = get_logger()
 logger.setLevel(INFO)
@@ -24,6 +37,13 @@ logger.setLevel(INFO)
 ###############################################################################
 ## Get Argument Parser
 
+# per user and outside the checkout, whatever directory the client runs from
+DEFAULT_SPOOL_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "labserverstatus"
+    / "spool"
+)
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
     "-i",
@@ -42,215 +62,229 @@ parser.add_argument(
 parser.add_argument(
     "-s",
     "--server",
-    dest="server",
-    default="http://127.0.0.1:8000",
-    help="Server address",
+    dest="servers",
+    action="append",
+    help="Server address, repeat (or comma-separate) to report to several servers",
+)
+parser.add_argument(
+    "--slow-interval",
+    dest="slow_interval",
+    default=300,
+    help="Refresh interval in seconds for rarely changing info (public IP)",
+)
+parser.add_argument(
+    "--mounts",
+    dest="mounts",
+    default="/",
+    help="Comma-separated mount points to report the capacity of",
+)
+parser.add_argument(
+    "--mount-interval",
+    dest="mount_interval",
+    default=60,
+    help="Refresh interval in seconds for filesystem capacity (statvfs)",
+)
+parser.add_argument(
+    "--delta",
+    dest="delta",
+    action="store_true",
+    help="Send a full baseline then only the changed fields",
+)
+parser.add_argument(
+    "--encoding",
+    dest="encoding",
+    default="json",
+    choices=["json", "msgpack", "cbor"],
+    help="Report payload format (msgpack / cbor need the msgpack / cbor2 package)",
+)
+parser.add_argument(
+    "--compress",
+    dest="compress",
+    default="none",
+    choices=["none", "gzip", "deflate"],
+    help="Report payload compression",
+)
+parser.add_argument(
+    "--spool-dir",
+    dest="spool_dir",
+    default=str(DEFAULT_SPOOL_DIR),
+    help="Directory for reports that could not be sent yet (default: %(default)s)",
+)
+parser.add_argument(
+    "--spool-max-mb",
+    dest="spool_max_mb",
+    default=64,
+    help="Maximum size of the spool in MiB, oldest reports are dropped first",
+)
+parser.add_argument(
+    "--spool-max-age",
+    dest="spool_max_age",
+    default=86400,
+    help="Maximum age of spooled reports in seconds",
+)
+parser.add_argument(
+    "--sample-interval",
+    dest="sample_interval",
+    default=1,
+    help="Seconds between high-frequency samples summarised in each report (0: off)",
+)
+parser.add_argument(
+    "--profile",
+    dest="profile",
+    action="store_true",
+    help="Add per-collector timings to reports and log them periodically",
+)
+parser.add_argument(
+    "--gpu-backend",
+    dest="gpu_backend",
+    default="auto",
+    choices=["auto", "nvml", "nvidia-smi", "fake"],
+    help="How to query GPUs (auto: NVML if available, else nvidia-smi)",
+)
+parser.add_argument(
+    "--asyncio",
+    dest="asyncio",
+    action="store_true",
+    help="Run the agent on asyncio, uploads overlap with the next collection",
 )
 
 args = parser.parse_args()
 
 # get value from parser
 INTERVAL = int(args.interval)
+SLOW_INTERVAL = int(args.slow_interval)
 MACHINE_NAME = str(args.name)
-SERVER = str(args.server)
+MOUNTS = [m.strip() for m in str(args.mounts).split(",") if m.strip()]
+MOUNT_INTERVAL = int(args.mount_interval)
+SERVERS = [
+    server.strip().rstrip("/")
+    for value in args.servers or ["http://127.0.0.1:8000"]
+    for server in value.split(",")
+    if server.strip()
+]
+GPU_BACKEND_NAME = str(args.gpu_backend)
+DELTA_MODE = bool(args.delta)
+PAYLOAD_FORMAT = str(args.encoding)
+PAYLOAD_COMPRESSION = str(args.compress)
+SPOOL_DIR = Path(args.spool_dir)
+SPOOL_MAX_MB = int(args.spool_max_mb)
+SPOOL_MAX_AGE = int(args.spool_max_age)
+SAMPLE_INTERVAL = float(args.sample_interval)
+PROFILE_MODE = bool(args.profile)
+ASYNCIO_MODE = bool(args.asyncio)
 
 ###############################################################################
 ## Constants
 
-if SERVER.endswith("/"):
-    SERVER = SERVER[:-1]
-POST_URL = SERVER + "/post"
-HEADERS = {"Content-type": "application/json", "Accept": "application/json"}
-PUBLIC_IP: str = ""
+CONNECT_TIMEOUT = 3  # seconds
+READ_TIMEOUT = 10  # seconds
+BACKOFF_MAX = 300  # seconds
+GPU_BACKEND = None
+GPU_BACKEND_LOCK = threading.Lock()
+PROC_TRACKER = ProcessTracker()
+USERS_COLLECTOR = UsersCollector()
+USER_ACCOUNTING = UserAccounting(passwd=USERS_COLLECTOR.passwd)
+NETWORK_COLLECTOR = NetworkCollector(max_age=SLOW_INTERVAL)
+THERMAL_COLLECTOR = ThermalCollector()
+DISK_COLLECTOR = DiskCollector()
+SAMPLER = None
+# always-on timings, dumped to the log on SIGUSR1
+PROFILER = Profiler()
+PROFILE_LOG_EVERY = 60  # ticks
+# reports waiting for upload per server, the oldest is spooled on overflow
+UPLOAD_QUEUE_SIZE = 4
+SHUTDOWN_TIMEOUT = 15  # seconds to flush pending reports on exit
+# one connection, backoff, spool and upload queue per server
+TARGETS = make_targets(
+    SERVERS,
+    MACHINE_NAME,
+    spool_dir=SPOOL_DIR,
+    payload_format=PAYLOAD_FORMAT,
+    compression=PAYLOAD_COMPRESSION,
+    delta=DELTA_MODE,
+    backoff_base=INTERVAL,
+    backoff_cap=BACKOFF_MAX,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    spool_max_bytes=SPOOL_MAX_MB * 1024**2,
+    spool_max_age=SPOOL_MAX_AGE,
+    queue_size=UPLOAD_QUEUE_SIZE,
+    profiler=PROFILER,
+)
 
 
 ###############################################################################
 ## Networks
 
 
-def is_connected() -> bool:
-    # https://stackoverflow.com/a/40283805
-    try:
-        # connect to the host -- tells us if the host is actually reachable
-        socket.create_connection(("1.1.1.1", 53))
-        return True
-    except OSError:
-        pass
-    return False
-
-
-def get_ip_addresses(family):
-    # Ref: https://stackoverflow.com/a/43478599
-    for interface, snics in psutil.net_if_addrs().items():
-        for snic in snics:
-            if snic.family == family:
-                yield (interface, snic.address)
-
-
-def get_ip() -> str:
+def get_ip() -> dict:
     info = {}
     try:
-        hostname = socket.gethostname()
-        info["hostname"] = hostname
-        info["local_ip"] = socket.gethostbyname(hostname)
-        info["ipv4s"] = list(get_ip_addresses(socket.AF_INET))
-        info["ipv6s"] = list(get_ip_addresses(socket.AF_INET6))
-        info["public_ip"] = get_public_ip()
+        info = NETWORK_COLLECTOR.addresses()
     except Exception as e:
         logger.error(e)
         info["error"] = str(e)
     return info
 
 
-def get_public_ip() -> str:
-    global PUBLIC_IP
-    if not PUBLIC_IP:
-        try:
-            # https://www.ipify.org/
-            PUBLIC_IP = requests.get("https://api64.ipify.org").content.decode("utf-8")
-        except Exception as e:
-            logger.error(e)
-
-    return PUBLIC_IP
+def get_net_rates() -> list:
+    return NETWORK_COLLECTOR.rates()
 
 
 ###############################################################################
-## TODO
+## Storage
 
 
-def get_temp_status():
-    # linux only
-    # TODO
-    try:
-        temp = psutil.sensors_temperatures()
-        return temp
-    except Exception as e:
-        logger.error(e)
-
-
-def get_fans_status():
-    # linux only
-    # TODO
-    try:
-        fans = psutil.sensors_fans()
-        return fans
-    except Exception as e:
-        logger.error(e)
+def get_disk_rates() -> list:
+    return DISK_COLLECTOR.rates()
 
 
-###############################################################################
-## System
-
-
-def _get_sys_uptime() -> Tuple[float, str]:
-    cmd = "cat /proc/uptime"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+def get_filesystem_collector(mount_point: str) -> Collector:
+    # one collector per mount point, so a hung NFS mount only stalls itself
+    return Collector(
+        f"filesystem:{mount_point}",
+        lambda: filesystem_usage(mount_point),
+        timeout=2,
+        default=None,
+        refresh=MOUNT_INTERVAL,
     )
-    if completed_proc.returncode != 0:
-        return 0, "NA"
 
-    output = completed_proc.stdout.decode("utf-8").strip()
-    uptime = float(output.split()[0])
-    days = int(uptime // 86400)
-    hours = int((uptime % 86400) // 3600)
-    minutes = int((uptime % 3600) // 60)
-
-    if days > 0:
-        uptime_str = f"{days}d {hours}h {minutes}m"
-    elif hours > 0:
-        uptime_str = f"{hours}h {minutes}m"
-    else:
-        uptime_str = f"{minutes}m"
-
-    return uptime, uptime_str
 
+###############################################################################
+## Thermal
 
-def _get_cpu_model() -> str:
-    cmd = "awk -F: '/model name/ {name=$2} END {print name}' /proc/cpuinfo"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return "NA"
 
-    output = completed_proc.stdout.decode("utf-8").strip()
-    return output
+def get_thermal_status() -> dict:
+    # linux only, hwmon sensors are opened once and re-read each tick
+    return THERMAL_COLLECTOR.collect()
 
 
-def _get_cpu_cores() -> int:
-    cmd = "awk -F: '/model name/ {core++} END {print core}' /proc/cpuinfo"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return 0
+###############################################################################
+## System
 
-    output = completed_proc.stdout.decode("utf-8").strip()
-    return int(output)
 
+def _get_sys_uptime() -> Tuple[float, str]:
+    try:
+        uptime = procfs.read_uptime()
+    except (OSError, ValueError, IndexError):
+        return 0, "NA"
 
-def _get_mac_address() -> str:
-    return ":".join(re.findall("..", "%012x" % uuid.getnode()))
+    return uptime, procfs.format_uptime(uptime)
 
 
 def get_sys_info() -> Dict[str, str]:
     info = {}
     try:
-        uptime, uptime_str = _get_sys_uptime()
-        info = dict(
-            uptime=uptime,
-            uptime_str=uptime_str,
-            platform=platform.system(),
-            platform_release=platform.release(),
-            platform_version=platform.version(),
-            architecture=platform.machine(),
-            processor=platform.processor(),
-            mac_address=_get_mac_address(),
-            cpu_model=_get_cpu_model(),
-            cpu_cores=_get_cpu_cores(),
-        )
+        info = dict(procfs.get_static_facts())
     except Exception as e:
         logger.error(e)
         info["error"] = str(e)
     return info
 
 
-###############################################################################
-## Processes
-
-
-def _get_proc_info(pid: int) -> dict:
-    try:
-        proc = psutil.Process(pid)
-        user = proc.username()
-        cpu_usage = round(proc.cpu_percent() / 100, 5)  # 0 ~ 1
-        cpu_mem_usage = round(proc.memory_percent() / 100, 5)  # 0 ~ 1
-        _create_time = proc.create_time()
-        _time_now = time.time()
-        proc_uptime: float = _time_now - _create_time  # seconds
-        proc_uptime_str = str(datetime.timedelta(seconds=int(proc_uptime)))
-        command = " ".join(proc.cmdline())
-
-        return dict(
-            pid=pid,
-            user=user,
-            cpu_usage=cpu_usage,
-            cpu_mem_usage=cpu_mem_usage,
-            proc_uptime=proc_uptime,
-            proc_uptime_str=proc_uptime_str,
-            command=command,
-        )
-    except Exception as e:
-        logger.error(e)
-
-    return None
+def get_uptime() -> Dict[str, float]:
+    uptime, uptime_str = _get_sys_uptime()
+    return dict(uptime=uptime, uptime_str=uptime_str)
 
 
 ###############################################################################
@@ -262,8 +296,8 @@ def get_sys_usage() -> Dict[str, float]:
     try:
         info["cpu_usage"] = psutil.cpu_percent() / 100  # 0 ~ 1
         mem = psutil.virtual_memory()
-        info["ram_total"] = mem.total / (1024.0 ** 2)  # MiB
-        info["ram_free"] = mem.available / (1024.0 ** 2)  # MiB
+        info["ram_total"] = mem.total / (1024.0**2)  # MiB
+        info["ram_free"] = mem.available / (1024.0**2)  # MiB
         info["ram_usage"] = round(mem.percent / 100, 5)  # 0 ~ 1
     except Exception as e:
         logger.error(e)
@@ -275,182 +309,63 @@ def get_sys_usage() -> Dict[str, float]:
 ## Users
 
 
-def _get_online_users() -> List[str]:
-    completed_proc = subprocess.run(
-        "users",
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return []
-
-    output = completed_proc.stdout.decode("utf-8").strip()
-    online_users = list(set(output.split()))
-    return online_users
-
-
-def _get_all_users() -> List[str]:
-    passwd_file = Path("/etc/passwd")
-    all_users: List[str] = []
-
-    if not passwd_file.exists():
-        return []
-
-    with passwd_file.open(mode="r") as f:
-        lines = f.readlines()
-        f.close()
-
-    for line in lines:
-        line = str(line).strip()
-        if line:
-            """
-            Ref: https://askubuntu.com/a/725122
-
-            /etc/passwd contains one line for each user account, with seven fields
-            delimited by colons (“:”). These fields are:
-
-            0 - login name
-            1 - optional encrypted password
-            2 - numerical user ID
-            3 - numerical group ID
-            4 - user name or comment field
-            5 - user home directory
-            6 - optional user command interpreter
-            """
-            user_data = line.split(":")
-            username = user_data[0]
-            user_id = user_data[2]
-            if 1000 <= int(user_id) <= 60000:
-                all_users.append(username)
-
-    all_users = list(set(all_users))
-    return all_users
-
-
-def get_users_info() -> Dict[str, List[str]]:
-    online_users = _get_online_users()
-    all_users = _get_all_users()
-    offline_users = all_users[:]
-    for u in online_users:
-        if u in offline_users:
-            offline_users.remove(u)
-
-    users = {
-        "all_users": all_users,
-        "online_users": online_users,
-        "offline_users": offline_users,
-    }
-    return users
+def get_users_info() -> dict:
+    return USERS_COLLECTOR.collect()
+
+
+def get_user_usage() -> list:
+    return USER_ACCOUNTING.collect()
 
 
 ###############################################################################
 ## GPU
 
 
+def _get_gpu_backend():
+    global GPU_BACKEND
+    # GPU collectors run concurrently, only one of them may init the backend
+    with GPU_BACKEND_LOCK:
+        if GPU_BACKEND is None:
+            GPU_BACKEND = gpu.get_gpu_backend(GPU_BACKEND_NAME)
+            logger.info(f"GPU backend: {GPU_BACKEND.name}")
+    return GPU_BACKEND
+
+
 def get_gpu_status() -> List[GPUStatus]:
     """
-    Get GPU utilization info via nvidia-smi command call
+    Get GPU utilization info via NVML, or nvidia-smi command call
     """
+    return _get_gpu_backend().gpu_status()
 
-    cmd = "nvidia-smi --query-gpu=index,gpu_name,utilization.gpu,temperature.gpu,memory.total,memory.used,memory.free --format=csv"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return []
-
-    output = completed_proc.stdout.decode("utf-8").strip()
-    gpu_status_list: List[GPUStatus] = []
-    lines = output.split("\n")
-    if len(lines) <= 1:
-        return []
-    for row in lines[1:]:
-        gpu_status = GPUStatus()
-        row = row.split(",")
-        if len(row) != 7:
-            continue
-        gpu_status.index = row[0].strip()
-        gpu_status.gpu_name = row[1].strip()
-        gpu_status.gpu_usage = float(row[2].strip("% ")) / 100
-        gpu_status.temperature = float(row[3].strip())
-        gpu_status.memory_total = float(row[4].strip(" MiB"))
-        gpu_mem_used = float(row[5].strip(" MiB"))
-        gpu_status.memory_free = float(row[6].strip(" MiB"))
-        # compute used memory percentage
-        # value returned by utilization.memory is not accurate
-        gpu_status.memory_usage = round(gpu_mem_used / gpu_status.memory_total, 5)
-        gpu_status_list.append(gpu_status)
-
-    return gpu_status_list
-
-
-def _get_gpu_uuid_index_map():
-    """
-    Get GPU uuid to index map
-    """
 
-    cmd = "nvidia-smi --query-gpu=index,uuid --format=csv"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return {}
+async def get_gpu_status_async() -> List[GPUStatus]:
+    return await _get_gpu_backend().gpu_status_async()
 
-    output = completed_proc.stdout.decode("utf-8").strip()
-    gpu_uuid_index_map: Dict[str, int] = {}
-    lines = output.split("\n")
-    if len(lines) <= 1:
-        return {}
-    for row in lines[1:]:
-        row = row.split(",")
-        if len(row) != 2:
-            continue
-        gpu_uuid_index_map[row[1].strip()] = int(row[0].strip())
 
-    return gpu_uuid_index_map
+def get_gpu_compute_processes() -> List[GPUComputeProcess]:
+    return _add_process_info(_get_gpu_backend().compute_processes())
 
 
-def get_gpu_compute_processes() -> List[GPUComputeProcess]:
-    cmd = "nvidia-smi --query-compute-apps=pid,gpu_uuid,used_gpu_memory --format=csv"
-    completed_proc = subprocess.run(
-        shlex.split(cmd),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    if completed_proc.returncode != 0:
-        return []
-
-    output = completed_proc.stdout.decode("utf-8").strip()
-    gpu_compute_processes: List[GPUComputeProcess] = []
-    lines = output.split("\n")
-    if len(lines) <= 1:
-        return []
-
-    gpu_uuid_index_map = _get_gpu_uuid_index_map()
-
-    for row in lines[1:]:
-        row = row.split(",")
-        if len(row) != 3:
-            continue
-        gpu_proc = GPUComputeProcess()
-        gpu_proc.pid = int(row[0].strip())
-        gpu_proc.gpu_uuid = row[1].strip()
-        gpu_proc.gpu_index = gpu_uuid_index_map.get(gpu_proc.gpu_uuid, -1)
-        gpu_proc.gpu_mem_used = float(row[2].strip(" MiB"))
+async def get_gpu_compute_processes_async() -> List[GPUComputeProcess]:
+    gpu_compute_processes = await _get_gpu_backend().compute_processes_async()
+    return await to_thread(_add_process_info, gpu_compute_processes)
+
+
+def _add_process_info(
+    gpu_compute_processes: List[GPUComputeProcess],
+) -> List[GPUComputeProcess]:
+    for gpu_proc in gpu_compute_processes:
         # get more details of the process from ps
-        proc_info: dict = _get_proc_info(gpu_proc.pid)
+        proc_info: dict = PROC_TRACKER.get_info(gpu_proc.pid) or {}
         gpu_proc.user = proc_info.get("user", "")
-        gpu_proc.cpu_usage = proc_info.get("cpu_usage", "")
-        gpu_proc.cpu_mem_usage = proc_info.get("cpu_mem_usage", "")
+        gpu_proc.cpu_usage = proc_info.get("cpu_usage")
+        gpu_proc.cpu_mem_usage = proc_info.get("cpu_mem_usage")
         gpu_proc.proc_uptime = proc_info.get("proc_uptime", 0)
         gpu_proc.proc_uptime_str = proc_info.get("proc_uptime_str", "")
         gpu_proc.command = proc_info.get("command", "")
 
-        gpu_compute_processes.append(gpu_proc)
+    # forget processes that no longer hold GPU memory
+    PROC_TRACKER.prune(gpu_proc.pid for gpu_proc in gpu_compute_processes)
 
     return gpu_compute_processes
 
@@ -459,11 +374,79 @@ def get_gpu_compute_processes() -> List[GPUComputeProcess]:
 ## get status
 
 
+def make_collectors(asyncio_mode: bool = False) -> List[Collector]:
+    """
+    Collectors run concurrently, each with its own deadline (seconds) and
+    refresh class; between refreshes a collector is served from cache.
+    In asyncio mode the nvidia-smi queries run as asyncio subprocesses.
+    """
+    gpu_status = get_gpu_status_async if asyncio_mode else get_gpu_status
+    gpu_compute_processes = (
+        get_gpu_compute_processes_async if asyncio_mode else get_gpu_compute_processes
+    )
+    return [
+        # static
+        Collector("sys_info", get_sys_info, timeout=1, default={}, refresh=ONCE),
+        # fast (addresses are cached until the interfaces change, /etc/passwd
+        # until it is modified: logins and logouts show up on the next tick)
+        Collector("users_info", get_users_info, timeout=2, default={}),
+        Collector("ip", get_ip, timeout=1, default={}),
+        Collector("net_rates", get_net_rates, timeout=1, default=[]),
+        Collector("uptime", get_uptime, timeout=1, default={}),
+        Collector("sys_usage", get_sys_usage, timeout=1, default={}),
+        Collector("thermal", get_thermal_status, timeout=1, default={}),
+        Collector("user_usage", get_user_usage, timeout=1, default=[]),
+        Collector("disks", get_disk_rates, timeout=1, default=[]),
+        Collector("gpu_status", gpu_status, timeout=3, default=[]),
+        Collector(
+            "gpu_compute_processes", gpu_compute_processes, timeout=3, default=[]
+        ),
+    ] + [get_filesystem_collector(mount_point) for mount_point in MOUNTS]
+
+
+if ASYNCIO_MODE:
+    COLLECTORS = AsyncCollectorScheduler(make_collectors(True), profiler=PROFILER)
+else:
+    COLLECTORS = CollectorScheduler(make_collectors(), profiler=PROFILER)
+
+
+def add_sample_summaries(status: MachineStatus, summaries: dict) -> None:
+    status.cpu_usage_stats = summaries.get("cpu_usage")
+    status.ram_usage_stats = summaries.get("ram_usage")
+    for gpu_status in status.gpu_status or []:
+        gpu_status.gpu_usage_stats = summaries.get(("gpu_usage", gpu_status.index))
+        gpu_status.memory_usage_stats = summaries.get(
+            ("memory_usage", gpu_status.index)
+        )
+        gpu_status.temperature_stats = summaries.get(("temperature", gpu_status.index))
+
+
+def start_sampler() -> None:
+    global SAMPLER
+    if SAMPLE_INTERVAL <= 0:
+        return
+    backend = _get_gpu_backend()
+    # nvidia-smi is far too expensive to launch several times per interval
+    gpu_status = backend.gpu_status if backend.name == "nvml" else None
+    # room for a few intervals worth of samples in case reports stall
+    capacity = max(16, int(4 * INTERVAL / SAMPLE_INTERVAL))
+    SAMPLER = Sampler(SAMPLE_INTERVAL, capacity, gpu_status=gpu_status)
+    SAMPLER.start()
+
+
 def get_status() -> MachineStatus:
+    return build_status(*COLLECTORS.collect())
+
+
+async def get_status_async() -> MachineStatus:
+    return build_status(*await COLLECTORS.collect())
 
-    ip = get_ip()
-    sys_info = get_sys_info()
-    sys_usage = get_sys_usage()
+
+def build_status(values: dict, stale: List[str]) -> MachineStatus:
+    ip = values["ip"]
+    sys_info = values["sys_info"]
+    sys_usage = values["sys_usage"]
+    uptime = values["uptime"]
 
     status: MachineStatus = MachineStatus()
     # Custom Machine Name
@@ -474,6 +457,7 @@ def get_status() -> MachineStatus:
     status.public_ip = ip.get("public_ip", "")
     status.ipv4s = ip.get("ipv4s", [])
     status.ipv6s = ip.get("ipv6s", [])
+    status.net_interfaces = values["net_rates"]
     # System
     status.architecture = sys_info.get("architecture", "")
     status.mac_address = sys_info.get("mac_address", "")
@@ -481,21 +465,42 @@ def get_status() -> MachineStatus:
     status.platform_release = sys_info.get("platform_release", "")
     status.platform_version = sys_info.get("platform_version", "")
     status.processor = sys_info.get("processor", "")
-    status.uptime = sys_info.get("uptime", 0)
-    status.uptime_str = sys_info.get("uptime_str", "")
+    status.uptime = uptime.get("uptime", 0)
+    status.uptime_str = uptime.get("uptime_str", "")
     # CPU
     status.cpu_model = sys_info.get("cpu_model", "")
     status.cpu_cores = sys_info.get("cpu_cores", 0)
-    status.cpu_usage = sys_usage.get("cpu_usage", "")
+    status.cpu_usage = sys_usage.get("cpu_usage")
     # RAM
-    status.ram_free = sys_usage.get("ram_free", "")
-    status.ram_total = sys_usage.get("ram_total", "")
-    status.ram_usage = sys_usage.get("ram_usage", "")
+    status.ram_free = sys_usage.get("ram_free")
+    status.ram_total = sys_usage.get("ram_total")
+    status.ram_usage = sys_usage.get("ram_usage")
+    # Storage
+    status.disks = values["disks"]
+    status.filesystems = [
+        values[f"filesystem:{mount_point}"]
+        for mount_point in MOUNTS
+        if values[f"filesystem:{mount_point}"] is not None
+    ]
+    # Thermal
+    thermal = values["thermal"]
+    status.cpu_temperature = thermal.get("cpu_temperature")
+    status.temperatures = thermal.get("temperatures", [])
+    status.fans = thermal.get("fans", [])
     # GPU
-    status.gpu_status = get_gpu_status()
-    status.gpu_compute_processes = get_gpu_compute_processes()
+    status.gpu_status = values["gpu_status"]
+    status.gpu_compute_processes = values["gpu_compute_processes"]
     # USER
-    status.users_info = get_users_info()
+    status.users_info = values["users_info"].get("users_info", {})
+    status.user_sessions = values["users_info"].get("user_sessions", [])
+    status.user_usage = add_gpu_memory(
+        values["user_usage"], values["gpu_compute_processes"]
+    )
+    # Collectors that missed their deadline or failed
+    status.stale_collectors = stale
+    # Summaries of the samples taken since the previous report
+    if SAMPLER is not None:
+        add_sample_summaries(status, SAMPLER.drain())
 
     return status
 
@@ -504,46 +509,230 @@ def get_status() -> MachineStatus:
 ## Main
 
 
-def report_to_server(status: MachineStatus) -> bool:
-    status: dict = dict(status.dict())
-    data: str = json.dumps(status, default=json_serial)
-    r = requests.post(POST_URL, data=data, headers=HEADERS)
-    if r.status_code != 201:
-        logger.error(f"status_code: {r.status_code}")
-        return False
-    else:
-        return True
+def last_send_time() -> Optional[float]:
+    """
+    Seconds spent sending the previous report to the slowest server
+    """
+    send_times = [t.send_time for t in TARGETS if t.send_time is not None]
+    return max(send_times, default=None)
+
+
+def spool_pending() -> None:
+    """
+    Spool the reports still waiting in the upload queues, e.g. on exit
+    """
+    for target in TARGETS:
+        for report in target.pending():
+            target.spool.append(report.as_json())
 
 
 def main(debug_mode: bool = False) -> None:
-    retry = 0
+    # warm up the boot-invariant facts once at startup
+    procfs.get_static_facts()
+    THERMAL_COLLECTOR.discover()
+    _get_gpu_backend()
+    start_sampler()
+    PROFILER.install_signal_handler()
+
+    for target in TARGETS:
+        target.start()
+
+    try:
+        report_forever(debug_mode)
+    except KeyboardInterrupt:
+        # unsent reports are uploaded from the spool on the next start
+        spool_pending()
+        raise
+
+
+def report_forever(debug_mode: bool = False) -> None:
+    ticker = Ticker(INTERVAL)
+    missed_ticks = 0
 
     while True:
-        sleep(INTERVAL)
-        sleep(retry)
+        missed_ticks += ticker.wait()
+        if missed_ticks:
+            logger.warning(f"Agent is behind schedule, {missed_ticks} tick(s) skipped")
 
         try:
-            if not is_connected():
-                logger.warning("Not Connected to Internet.")
-                retry += 5
-                continue
-
-            status: MachineStatus = get_status()
+            start = time.monotonic()
+            with PROFILER.measure("get_status"):
+                status: MachineStatus = get_status()
+            status.agent_stats = AgentStats(
+                tick=ticker.tick,
+                collection_time=round(time.monotonic() - start, 5),
+                send_time=last_send_time(),
+                missed_ticks=missed_ticks,
+            )
+            missed_ticks = 0
+            if PROFILE_MODE:
+                status.agent_stats.profile = PROFILER.summary()
+                if ticker.tick % PROFILE_LOG_EVERY == 0:
+                    PROFILER.dump()
             if debug_mode:
                 logger.info(status)
                 continue
 
-            successful = report_to_server(status)
-            if successful:
-                retry = 0
-                print("201 OK")
-            else:
-                retry += 5
+            # collected and serialised once, sent by every target's own thread
+            report = Report(status)
+            for target in TARGETS:
+                target.submit(report)
 
         except Exception as e:
             logger.error(e)
-            retry += 5
+
+
+###############################################################################
+## Asyncio Agent
+
+
+class AsyncAgent:
+    """
+    Collect on schedule while previous reports are still being uploaded
+
+    The tick loop only builds reports and hands them to one bounded queue
+    per server; each server has a single upload task draining its queue, so
+    sends stay in order, a slow server does not hold back the others, and
+    a target's delta encoder / transport are never used concurrently. When
+    uploads fall behind, the oldest queued report is moved to the spool. On
+    SIGINT / SIGTERM the queues are flushed (within SHUTDOWN_TIMEOUT) before
+    exiting; whatever could not be sent is spooled for the next start.
+    """
+
+    def __init__(self, debug_mode: bool = False):
+        self.debug_mode = debug_mode
+        self.queues: Dict[Target, asyncio.Queue] = {
+            target: asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE) for target in TARGETS
+        }
+        self.stop = asyncio.Event()
+        self.in_flight: Dict[Target, Report] = {}
+
+    async def spool(self, target: Target, reports: List[Report]) -> None:
+        for report in reports:
+            await to_thread(target.spool.append, report.as_json())
+
+    def enqueue(self, target: Target, report: Report) -> List[Report]:
+        """
+        Queue a report, returns the reports evicted to make room for it
+        """
+        queue = self.queues[target]
+        evicted = []
+        while queue.full():
+            evicted.append(queue.get_nowait())
+            queue.task_done()
+        queue.put_nowait(report)
+        if evicted:
+            logger.warning(
+                f"Uploads to {target.server} are behind, "
+                f"spooling {len(evicted)} report(s)"
+            )
+        return evicted
+
+    async def uploader(self, target: Target) -> None:
+        queue = self.queues[target]
+        while True:
+            self.in_flight[target] = await queue.get()
+            try:
+                await to_thread(target.deliver, self.in_flight[target])
+            except Exception as e:
+                logger.error(e)
+            finally:
+                self.in_flight.pop(target, None)
+                queue.task_done()
+
+    async def flush(self, uploaders: List[asyncio.Task]) -> None:
+        joins = [queue.join() for queue in self.queues.values()]
+        try:
+            await asyncio.wait_for(asyncio.gather(*joins), timeout=SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Could not flush pending reports in time, spooling them")
+        for uploader in uploaders:
+            uploader.cancel()
+        await asyncio.gather(*uploaders, return_exceptions=True)
+
+        for target, queue in self.queues.items():
+            pending: List[Report] = []
+            # a report cut off mid-send may be spooled and uploaded twice, the
+            # server keeps the newest report per machine so that is harmless
+            if target in self.in_flight:
+                pending.append(self.in_flight[target])
+            while not queue.empty():
+                pending.append(queue.get_nowait())
+            await self.spool(target, pending)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop.set)
+
+        uploaders = [asyncio.ensure_future(self.uploader(target)) for target in TARGETS]
+        stopping = asyncio.ensure_future(self.stop.wait())
+        ticker = Ticker(INTERVAL)
+        missed_ticks = 0
+
+        while True:
+            tick = asyncio.ensure_future(ticker.wait_async())
+            await asyncio.wait({tick, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            if self.stop.is_set():
+                tick.cancel()
+                break
+            missed_ticks += tick.result()
+            if missed_ticks:
+                logger.warning(
+                    f"Agent is behind schedule, {missed_ticks} tick(s) skipped"
+                )
+
+            try:
+                start = time.monotonic()
+                with PROFILER.measure("get_status"):
+                    status: MachineStatus = await get_status_async()
+                status.agent_stats = AgentStats(
+                    tick=ticker.tick,
+                    collection_time=round(time.monotonic() - start, 5),
+                    send_time=last_send_time(),
+                    missed_ticks=missed_ticks,
+                )
+                missed_ticks = 0
+                if PROFILE_MODE:
+                    status.agent_stats.profile = PROFILER.summary()
+                    if ticker.tick % PROFILE_LOG_EVERY == 0:
+                        PROFILER.dump()
+                if self.debug_mode:
+                    logger.info(status)
+                    continue
+
+                # collected and serialised once, sent by every target
+                report = Report(status)
+                for target in TARGETS:
+                    evicted = self.enqueue(target, report)
+                    if evicted:
+                        await self.spool(target, evicted)
+
+            except Exception as e:
+                logger.error(e)
+
+        logger.info("Shutting down, flushing pending reports")
+        await self.flush(uploaders)
+        await COLLECTORS.shutdown()
+        if SAMPLER is not None:
+            SAMPLER.stop()
+        for target in TARGETS:
+            target.close()
+
+
+async def main_async(debug_mode: bool = False) -> None:
+    # warm up the boot-invariant facts once at startup
+    procfs.get_static_facts()
+    THERMAL_COLLECTOR.discover()
+    _get_gpu_backend()
+    start_sampler()
+    PROFILER.install_signal_handler()
+
+    await AsyncAgent(debug_mode=debug_mode).run()
 
 
 if __name__ == "__main__":
-    main(debug_mode=False)
+    if ASYNCIO_MODE:
+        asyncio.run(main_async(debug_mode=False))
+    else:
+        main(debug_mode=False)
@@ -0,0 +1,183 @@
+import socket
+import threading
+import time
+from logging import INFO
+from typing import Callable, Dict, List, Optional, Tuple
+
+import procfs
+import psutil
+import requests
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+PUBLIC_IP_URL = "https://api64.ipify.org"  # https://www.ipify.org/
+PUBLIC_IP_TIMEOUT = (3, 5)  # seconds, connect / read
+PUBLIC_IP_TTL = 3600  # seconds
+RETRY_AFTER = 60  # seconds, after a failed background lookup
+
+
+###############################################################################
+## Background Values
+
+
+class BackgroundValue:
+    """
+    A value that is slow or unreliable to compute (DNS, HTTP)
+
+    get() never blocks: it returns the last known value (None until the
+    first lookup succeeds) and, when that value is older than `ttl`, starts
+    a refresh on a daemon thread. A failed lookup keeps the old value and is
+    retried after `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], str],
+        ttl: float,
+        retry_after: float = RETRY_AFTER,
+    ):
+        self.name = name
+        self.func = func
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.value: Optional[str] = None
+        # monotonic time after which a refresh is due
+        self.refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self) -> Optional[str]:
+        with self._lock:
+            running = self._thread is not None and self._thread.is_alive()
+            if not running and time.monotonic() >= self.refresh_at:
+                self._thread = threading.Thread(
+                    target=self._refresh, name=self.name, daemon=True
+                )
+                self._thread.start()
+        return self.value
+
+    def set(self, value: str) -> None:
+        self.value = value
+        self.refresh_at = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        self.refresh_at = 0.0
+
+    def _refresh(self) -> None:
+        try:
+            self.set(self.func())
+        except Exception as e:
+            logger.error(f"{self.name} lookup failed: {e}")
+            self.refresh_at = time.monotonic() + self.retry_after
+
+
+def lookup_public_ip() -> str:
+    r = requests.get(PUBLIC_IP_URL, timeout=PUBLIC_IP_TIMEOUT)
+    r.raise_for_status()
+    return r.content.decode("utf-8").strip()
+
+
+def lookup_local_ip() -> str:
+    # may block on DNS when the hostname is not in /etc/hosts
+    return socket.gethostbyname(socket.gethostname())
+
+
+###############################################################################
+## Collector
+
+
+def get_ip_addresses(family) -> List[Tuple[str, str]]:
+    # Ref: https://stackoverflow.com/a/43478599
+    addresses = []
+    for interface, snics in psutil.net_if_addrs().items():
+        for snic in snics:
+            if snic.family == family:
+                addresses.append((interface, snic.address))
+    return addresses
+
+
+class NetworkCollector:
+    """
+    Interface addresses, public IP and per-interface throughput
+
+    Addresses are re-read only when the set of interfaces (or their link
+    state) in /sys/class/net changes, or at the latest every `max_age`
+    seconds to catch address changes on an unchanged link. The local and
+    public IPs are resolved in the background, so no call ever waits on DNS
+    or on the network. Throughput rates are computed from the deltas of the
+    /proc/net/dev counters between two calls.
+    """
+
+    def __init__(self, max_age: float = 300, public_ip_ttl: float = PUBLIC_IP_TTL):
+        self.max_age = max_age
+        self.public_ip = BackgroundValue("public-ip", lookup_public_ip, public_ip_ttl)
+        self.local_ip = BackgroundValue("local-ip", lookup_local_ip, max_age)
+
+        self._signature = None
+        self._refreshed_at: Optional[float] = None
+        self._addresses: Dict[str, object] = {}
+
+        self._last_counters: Dict[str, Tuple[int, int, int, int]] = {}
+        self._last_counters_at: Optional[float] = None
+
+    def _refresh_addresses(self) -> None:
+        self._addresses = dict(
+            hostname=socket.gethostname(),
+            ipv4s=get_ip_addresses(socket.AF_INET),
+            ipv6s=get_ip_addresses(socket.AF_INET6),
+        )
+
+    def addresses(self) -> dict:
+        now = time.monotonic()
+        signature = procfs.read_net_interfaces()
+        changed = signature != self._signature
+        expired = self._refreshed_at is None or now - self._refreshed_at >= self.max_age
+        if changed or expired:
+            if changed and self._signature is not None:
+                logger.info("Network interfaces changed, refreshing addresses")
+                self.local_ip.invalidate()
+                self.public_ip.invalidate()
+            self._refresh_addresses()
+            self._signature = signature
+            self._refreshed_at = now
+
+        return dict(
+            self._addresses,
+            local_ip=self.local_ip.get() or "",
+            public_ip=self.public_ip.get() or "",
+        )
+
+    def rates(self) -> List[dict]:
+        now = time.monotonic()
+        try:
+            counters = procfs.read_net_dev()
+        except OSError:
+            return []
+        last, last_at = self._last_counters, self._last_counters_at
+        self._last_counters, self._last_counters_at = counters, now
+        if last_at is None or now <= last_at:
+            return []
+
+        elapsed = now - last_at
+        rates = []
+        for name, values in sorted(counters.items()):
+            if name == "lo" or name not in last:
+                continue
+            deltas = [v - old for v, old in zip(values, last[name])]
+            # counters reset (interface re-created) or wrapped
+            if any(d < 0 for d in deltas):
+                continue
+            rx_bytes, rx_packets, tx_bytes, tx_packets = deltas
+            rates.append(
+                dict(
+                    name=name,
+                    rx_bytes_rate=round(rx_bytes / elapsed, 1),
+                    tx_bytes_rate=round(tx_bytes / elapsed, 1),
+                    rx_packets_rate=round(rx_packets / elapsed, 1),
+                    tx_packets_rate=round(tx_packets / elapsed, 1),
+                )
+            )
+        return rates
@@ -0,0 +1,96 @@
+import datetime
+import time
+from logging import INFO
+from typing import Dict, Iterable, Optional, Tuple
+
+import psutil
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+
+class _TrackedProcess:
+    __slots__ = ("key", "proc", "user", "command", "create_time", "primed")
+
+    def __init__(self, proc: psutil.Process):
+        with proc.oneshot():
+            self.create_time: float = proc.create_time()
+            self.user: str = proc.username()
+            self.command: str = " ".join(proc.cmdline())
+
+        self.key: Tuple[int, float] = (proc.pid, self.create_time)
+        self.proc = proc
+        self.primed = False
+
+
+class ProcessTracker:
+    """
+    Keep psutil.Process objects alive across ticks
+
+    Entries are keyed by (pid, create_time) so a recycled PID is detected and
+    treated as a new process. Immutable fields (user, command line, create
+    time) are read once; each tick only the CPU / memory usage is sampled,
+    batched in a single oneshot() context. cpu_percent() therefore measures
+    the real delta since the previous tick instead of always returning 0.0.
+    """
+
+    def __init__(self):
+        self._procs: Dict[int, _TrackedProcess] = {}
+
+    def __len__(self) -> int:
+        return len(self._procs)
+
+    def _lookup(self, pid: int) -> _TrackedProcess:
+        tracked = self._procs.get(pid)
+        if tracked is not None:
+            # is_running() compares create_time, so this also catches PID reuse
+            if tracked.proc.is_running():
+                return tracked
+            del self._procs[pid]
+
+        tracked = _TrackedProcess(psutil.Process(pid))
+        self._procs[pid] = tracked
+        return tracked
+
+    def get_info(self, pid: int) -> Optional[dict]:
+        try:
+            tracked = self._lookup(pid)
+            proc = tracked.proc
+            with proc.oneshot():
+                cpu_percent = proc.cpu_percent()
+                mem_percent = proc.memory_percent()
+        except psutil.NoSuchProcess:
+            self._procs.pop(pid, None)
+            return None
+        except Exception as e:
+            logger.error(e)
+            return None
+
+        # the first cpu_percent() call only sets the baseline (always 0.0)
+        if tracked.primed:
+            cpu_usage = round(cpu_percent / 100, 5)  # 0 ~ 1 per core
+        else:
+            # no baseline yet, report unknown rather than a bogus 0.0
+            cpu_usage = None
+            tracked.primed = True
+
+        proc_uptime: float = time.time() - tracked.create_time  # seconds
+        return dict(
+            pid=pid,
+            user=tracked.user,
+            cpu_usage=cpu_usage,
+            cpu_mem_usage=round(mem_percent / 100, 5),  # 0 ~ 1
+            proc_uptime=proc_uptime,
+            proc_uptime_str=str(datetime.timedelta(seconds=int(proc_uptime))),
+            command=tracked.command,
+        )
+
+    def prune(self, alive_pids: Iterable[int]) -> None:
+        """
+        Evict every tracked process not in `alive_pids`
+        """
+        alive_pids = set(alive_pids)
+        for pid in list(self._procs.keys()):
+            if pid not in alive_pids:
+                del self._procs[pid]
@@ -0,0 +1,217 @@
+import os
+import platform
+import re
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+###############################################################################
+## Constants
+
+PROC_ROOT = Path("/proc")
+SYS_ROOT = Path("/sys")
+ETC_ROOT = Path("/etc")
+RUN_ROOT = Path("/run")
+
+
+def set_root(root: Path) -> None:
+    """
+    Read proc/, sys/, etc/ and run/ under `root` instead of /, e.g. a fixture tree
+
+    Must be called before the first collection. psutil keeps using /proc.
+    """
+    global PROC_ROOT, SYS_ROOT, ETC_ROOT, RUN_ROOT
+    root = Path(root)
+    PROC_ROOT = root / "proc"
+    SYS_ROOT = root / "sys"
+    ETC_ROOT = root / "etc"
+    RUN_ROOT = root / "run"
+
+
+###############################################################################
+## Readers
+
+OCTAL_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def read_text(path: Path) -> str:
+    """
+    Read a procfs / sysfs file without spawning any subprocess
+    """
+    with open(path, mode="r") as f:
+        return f.read()
+
+
+def read_uptime() -> float:
+    """
+    Seconds since boot, read from /proc/uptime
+    """
+    content = read_text(PROC_ROOT / "uptime")
+    return float(content.split()[0])
+
+
+def read_cpuinfo() -> Tuple[str, int]:
+    """
+    Parse /proc/cpuinfo in a single pass
+
+    Returns the last "model name" seen and the number of "model name" lines
+    (i.e. logical processors), same as the awk one-liners this replaces.
+    """
+    cpu_model = ""
+    cpu_cores = 0
+    for line in read_text(PROC_ROOT / "cpuinfo").splitlines():
+        if line.startswith("model name"):
+            cpu_model = line.split(":", 1)[1].strip()
+            cpu_cores += 1
+
+    if cpu_cores == 0:
+        # e.g. aarch64 kernels do not print "model name"
+        cpu_cores = os.cpu_count() or 0
+
+    return cpu_model, cpu_cores
+
+
+def read_cpu_times() -> Tuple[int, int]:
+    """
+    Aggregate (busy, total) CPU jiffies from the first line of /proc/stat
+
+    Utilisation over a period is the ratio of the deltas of two readings.
+    """
+    with open(PROC_ROOT / "stat", mode="r") as f:
+        fields = f.readline().split()
+    # user nice system idle iowait irq softirq steal (guest is part of user)
+    values = [int(v) for v in fields[1:9]]
+    total = sum(values)
+    idle = values[3] + values[4]
+    return total - idle, total
+
+
+def read_net_dev() -> Dict[str, Tuple[int, int, int, int]]:
+    """
+    Interface -> (rx bytes, rx packets, tx bytes, tx packets) from /proc/net/dev
+    """
+    counters = {}
+    # the first two lines are headers
+    for line in read_text(PROC_ROOT / "net" / "dev").splitlines()[2:]:
+        name, _, fields = line.partition(":")
+        values = fields.split()
+        if len(values) < 10:
+            continue
+        counters[name.strip()] = (
+            int(values[0]),
+            int(values[1]),
+            int(values[8]),
+            int(values[9]),
+        )
+    return counters
+
+
+def read_diskstats() -> Dict[str, Tuple[int, int, int, int, int]]:
+    """
+    Device -> (reads, sectors read, writes, sectors written, ms doing I/O)
+    from /proc/diskstats (sectors are always 512 bytes there)
+    """
+    counters = {}
+    for line in read_text(PROC_ROOT / "diskstats").splitlines():
+        values = line.split()
+        if len(values) < 14:
+            continue
+        counters[values[2]] = (
+            int(values[3]),
+            int(values[5]),
+            int(values[7]),
+            int(values[9]),
+            int(values[12]),
+        )
+    return counters
+
+
+def read_block_devices() -> Optional[List[str]]:
+    """
+    Whole-disk block devices (partitions are not listed in /sys/block)
+    """
+    try:
+        return sorted(os.listdir(SYS_ROOT / "block"))
+    except OSError:
+        return None
+
+
+def read_mounts() -> Dict[str, Tuple[str, str]]:
+    """
+    Mount point -> (device, filesystem type), from /proc/self/mounts
+    """
+    mounts = {}
+    for line in read_text(PROC_ROOT / "self" / "mounts").splitlines():
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        # spaces etc. in mount points are octal-escaped, e.g. \040
+        mount_point = OCTAL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), fields[1])
+        mounts[mount_point] = (fields[0], fields[2])
+    return mounts
+
+
+def read_net_interfaces() -> Optional[List[Tuple[str, str]]]:
+    """
+    (name, operstate) of every network interface, from /sys/class/net
+
+    Cheap enough to poll every tick to detect interfaces coming and going or
+    links going up / down. None where sysfs is not available.
+    """
+    net = SYS_ROOT / "class" / "net"
+    try:
+        names = sorted(os.listdir(net))
+    except OSError:
+        return None
+
+    interfaces = []
+    for name in names:
+        try:
+            operstate = read_text(net / name / "operstate").strip()
+        except OSError:
+            operstate = ""
+        interfaces.append((name, operstate))
+    return interfaces
+
+
+def format_uptime(uptime: float) -> str:
+    days = int(uptime // 86400)
+    hours = int((uptime % 86400) // 3600)
+    minutes = int((uptime % 3600) // 60)
+
+    if days > 0:
+        return f"{days}d {hours}h {minutes}m"
+    elif hours > 0:
+        return f"{hours}h {minutes}m"
+    else:
+        return f"{minutes}m"
+
+
+###############################################################################
+## Static Facts
+
+
+@lru_cache(maxsize=None)
+def get_static_facts() -> Dict[str, str]:
+    """
+    Boot-invariant system facts, computed once per agent lifetime
+
+    Note: platform.processor() and uuid.getnode() may both fork helper
+    binaries (uname / ip) under the hood, so they must not run every tick.
+    """
+    try:
+        cpu_model, cpu_cores = read_cpuinfo()
+    except OSError:
+        cpu_model, cpu_cores = "NA", 0
+
+    return dict(
+        platform=platform.system(),
+        platform_release=platform.release(),
+        platform_version=platform.version(),
+        architecture=platform.machine(),
+        processor=platform.processor(),
+        mac_address=":".join(re.findall("..", "%012x" % uuid.getnode())),
+        cpu_model=cpu_model,
+        cpu_cores=cpu_cores,
+    )
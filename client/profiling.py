@@ -0,0 +1,189 @@
+import bisect
+import math
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging import INFO
+from typing import Deque, Dict, List
+
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+# upper bounds (seconds) of the wall time histogram buckets, plus +inf
+BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+###############################################################################
+## Subprocess Counting
+
+_local = threading.local()
+_audit_hook_installed = False
+# audit hooks are Python 3.8+, on 3.7 subprocess counts are unknown
+AUDIT_HOOKS = hasattr(sys, "addaudithook")
+
+
+def _audit_hook(event: str, args: tuple) -> None:
+    # every subprocess.Popen raises this audit event in the calling thread
+    if event == "subprocess.Popen":
+        _local.subprocesses = getattr(_local, "subprocesses", 0) + 1
+
+
+def _install_audit_hook() -> None:
+    global _audit_hook_installed
+    if AUDIT_HOOKS and not _audit_hook_installed:
+        sys.addaudithook(_audit_hook)
+        _audit_hook_installed = True
+
+
+def _subprocess_count() -> int:
+    return getattr(_local, "subprocesses", 0)
+
+
+###############################################################################
+## Histograms
+
+
+class RollingHistogram:
+    """
+    The last `size` observations of a metric, plus lifetime count and total
+    """
+
+    def __init__(self, size: int = 256):
+        self.values: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float:
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def mean(self) -> float:
+        if not self.values:
+            return 0.0
+        return sum(self.values) / len(self.values)
+
+    def buckets(self, bounds: List[float] = BUCKETS) -> List[int]:
+        counts = [0] * (len(bounds) + 1)
+        for value in self.values:
+            counts[bisect.bisect_left(bounds, value)] += 1
+        return counts
+
+
+class Timing:
+    __slots__ = ("wall", "cpu", "subprocesses")
+
+    def __init__(self, size: int):
+        self.wall = RollingHistogram(size)
+        self.cpu = RollingHistogram(size)
+        self.subprocesses = RollingHistogram(size)
+
+
+###############################################################################
+## Profiler
+
+
+class Profiler:
+    """
+    Record wall time, CPU time and subprocess launches per named section
+
+    Cheap enough to stay on permanently: two clock reads and a thread-local
+    counter per measured section. Subprocesses are counted with an audit
+    hook, so on Python 3.7 their count is reported as unknown (None). CPU
+    time is the calling thread's, so it is correct for collectors running
+    concurrently on a thread pool.
+    """
+
+    def __init__(self, window: int = 256):
+        self.window = window
+        self.timings: Dict[str, Timing] = {}
+        self._lock = threading.Lock()
+        _install_audit_hook()
+
+    @contextmanager
+    def measure(self, name: str):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        procs_start = _subprocess_count()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            procs = _subprocess_count() - procs_start
+            with self._lock:
+                timing = self.timings.get(name)
+                if timing is None:
+                    timing = self.timings[name] = Timing(self.window)
+                timing.wall.add(wall)
+                timing.cpu.add(cpu)
+                timing.subprocesses.add(procs)
+
+    async def measure_async(self, name: str, coro):
+        """
+        Time a coroutine; wall time only is meaningful, since the CPU time
+        and subprocess counters of the event loop thread are shared by all
+        tasks running concurrently
+        """
+        with self.measure(name):
+            return await coro
+
+    def wrap(self, name: str, func):
+        def wrapper(*args, **kwargs):
+            with self.measure(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            items = list(self.timings.items())
+
+        return {
+            name: dict(
+                count=t.wall.count,
+                wall_mean=round(t.wall.mean(), 6),
+                wall_p95=round(t.wall.percentile(0.95), 6),
+                wall_max=round(max(t.wall.values, default=0.0), 6),
+                wall_buckets=t.wall.buckets(),
+                cpu_mean=round(t.cpu.mean(), 6),
+                subprocesses_mean=(
+                    round(t.subprocesses.mean(), 3) if AUDIT_HOOKS else None
+                ),
+            )
+            for name, t in items
+        }
+
+    def format_table(self) -> str:
+        lines = [
+            f"{'section':<24} {'count':>7} {'wall ms':>9} {'p95 ms':>9} "
+            f"{'max ms':>9} {'cpu ms':>9} {'procs':>6}"
+        ]
+        for name, s in sorted(self.summary().items()):
+            procs = s["subprocesses_mean"]
+            procs = "n/a" if procs is None else f"{procs:.2f}"
+            lines.append(
+                f"{name:<24} {s['count']:>7} {s['wall_mean'] * 1e3:>9.2f} "
+                f"{s['wall_p95'] * 1e3:>9.2f} {s['wall_max'] * 1e3:>9.2f} "
+                f"{s['cpu_mean'] * 1e3:>9.2f} {procs:>6}"
+            )
+        return "\n".join(lines)
+
+    def dump(self) -> None:
+        logger.info("Collector timings (rolling window)\n" + self.format_table())
+
+    def install_signal_handler(self, signum: int = signal.SIGUSR1) -> None:
+        """
+        Dump the timings to the log on `kill -USR1 <pid>`
+        """
+        signal.signal(signum, lambda *_: self.dump())
@@ -0,0 +1,118 @@
+import math
+import threading
+from collections import deque
+from logging import INFO
+from typing import Callable, Deque, Dict, Hashable, List, Optional
+
+import procfs
+import psutil
+from data_model import MetricSummary
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+
+def summarize(values: List[float]) -> Optional[MetricSummary]:
+    """
+    min / mean / max / p95 (nearest-rank) of a list of samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    n = len(ordered)
+    p95 = ordered[max(0, math.ceil(0.95 * n) - 1)]
+    return MetricSummary(
+        min=round(ordered[0], 5),
+        mean=round(sum(ordered) / n, 5),
+        max=round(ordered[-1], 5),
+        p95=round(p95, 5),
+        samples=n,
+    )
+
+
+class Sampler:
+    """
+    Sample cheap counters on a background thread between two reports
+
+    Samples go into fixed-size per-metric buffers (oldest samples are
+    overwritten if reports stall) and are drained into min / mean / max /
+    p95 summaries when a report is built. CPU utilisation is computed from
+    /proc/stat deltas owned by the sampler, so it does not interfere with
+    psutil.cpu_percent() used by the regular collector.
+
+    `gpu_status` is an optional callable returning the current GPUStatus
+    list; it should be cheap (NVML), not a nvidia-smi launch.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        capacity: int,
+        gpu_status: Callable[[], list] = None,
+    ):
+        self.interval = interval
+        self.capacity = capacity
+        self.gpu_status = gpu_status
+        self._buffers: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._last_cpu_times = None
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _add(self, key: Hashable, value: Optional[float]) -> None:
+        if value is None:
+            return
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = deque(maxlen=self.capacity)
+        buffer.append(value)
+
+    def sample(self) -> None:
+        busy, total = procfs.read_cpu_times()
+        cpu_usage = None
+        if self._last_cpu_times is not None:
+            last_busy, last_total = self._last_cpu_times
+            if total > last_total:
+                cpu_usage = (busy - last_busy) / (total - last_total)
+        self._last_cpu_times = (busy, total)
+
+        ram_usage = psutil.virtual_memory().percent / 100
+        gpu_status_list = self.gpu_status() if self.gpu_status else []
+
+        with self._lock:
+            if cpu_usage is not None:
+                self._add("cpu_usage", cpu_usage)
+            self._add("ram_usage", ram_usage)
+            for gpu in gpu_status_list:
+                self._add(("gpu_usage", gpu.index), gpu.gpu_usage)
+                self._add(("memory_usage", gpu.index), gpu.memory_usage)
+                self._add(("temperature", gpu.index), gpu.temperature)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(e)
+
+    def drain(self) -> Dict[Hashable, MetricSummary]:
+        """
+        Summaries of everything sampled since the previous drain
+        """
+        with self._lock:
+            buffers = self._buffers
+            self._buffers = {}
+
+        summaries = {}
+        for key, buffer in buffers.items():
+            summary = summarize(list(buffer))
+            if summary is not None:
+                summaries[key] = summary
+        return summaries
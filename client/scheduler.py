@@ -0,0 +1,275 @@
+import asyncio
+import functools
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from logging import INFO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+###############################################################################
+## Refresh Classes
+
+EVERY_TICK = 0.0  # fast metrics, e.g. CPU / GPU utilisation
+ONCE = float("inf")  # static facts, computed once at startup
+
+
+async def to_thread(func: Callable, *args) -> Any:
+    """
+    Run a blocking function on the loop's default executor
+
+    Same as asyncio.to_thread, which only exists on Python 3.9+.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
+
+
+###############################################################################
+## Collectors
+
+
+class Collector:
+    """
+    A named collector function with a per-run time budget (seconds)
+
+    `refresh` is the minimum number of seconds between two successful runs:
+    EVERY_TICK, ONCE, or any number in between for slow-changing metrics.
+    Between refreshes the cached value is served.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        timeout: float,
+        default: Any = None,
+        refresh: float = EVERY_TICK,
+    ):
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+        self.default = default
+        self.refresh = refresh
+        # last successful value, served between refreshes or when a run
+        # misses its deadline
+        self.last_value: Any = default
+        # monotonic time at which the last successful run was started
+        self.last_success: Optional[float] = None
+        # a run that is still executing (possibly from a previous tick)
+        self.future: Optional[Future] = None
+        self.submitted_at: float = 0.0
+
+    def is_due(self, now: float) -> bool:
+        if self.last_success is None:
+            return True
+        return now - self.last_success >= self.refresh
+
+    def is_running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    def harvest(self) -> None:
+        """
+        Pick up the result of a run that finished after its deadline
+        """
+        if self.future is None or not self.future.done():
+            return
+        future, self.future = self.future, None
+        if future.exception() is None:
+            self.last_value = future.result()
+            self.last_success = self.submitted_at
+
+
+class CollectorScheduler:
+    """
+    Run independent collectors concurrently on a small thread pool
+
+    Only collectors that are due for a refresh are started; the others are
+    served from cache. Every run gets its own deadline. A collector that
+    misses it (or raises) does not block the snapshot: its last good value
+    is served instead and its name is reported as stale. A collector that
+    is still running from a previous tick is not started again, so a hung
+    call (e.g. nvidia-smi on a GPU that fell off the bus) occupies at most
+    one worker thread.
+    """
+
+    def __init__(
+        self,
+        collectors: List[Collector],
+        max_workers: int = None,
+        profiler=None,
+    ):
+        self.collectors: Dict[str, Collector] = {c.name: c for c in collectors}
+        # optional profiling.Profiler timing every collector run
+        self.profiler = profiler
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(collectors),
+            thread_name_prefix="collector",
+        )
+
+    def collect(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Returns collector name -> value, and the names of stale collectors
+        """
+        start = time.monotonic()
+
+        running: List[Collector] = []
+        for c in self.collectors.values():
+            if not c.is_running():
+                c.harvest()
+                if not c.is_due(start):
+                    continue
+                func = c.func
+                if self.profiler is not None:
+                    func = self.profiler.wrap(c.name, func)
+                c.future = self.executor.submit(func)
+                c.submitted_at = start
+            running.append(c)
+
+        values: Dict[str, Any] = {
+            c.name: c.last_value for c in self.collectors.values()
+        }
+        stale: List[str] = []
+        for c in running:
+            remaining = max(0, c.submitted_at + c.timeout - time.monotonic())
+            try:
+                c.future.result(timeout=remaining)
+                c.harvest()
+                values[c.name] = c.last_value
+                continue
+            except FutureTimeoutError:
+                logger.warning(f"Collector '{c.name}' missed its {c.timeout}s deadline")
+            except Exception as e:
+                logger.error(f"Collector '{c.name}' failed: {e}")
+                c.future = None
+
+            stale.append(c.name)
+
+        return values, stale
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+class AsyncCollectorScheduler:
+    """
+    The asyncio counterpart of CollectorScheduler
+
+    Collectors that are coroutine functions (e.g. nvidia-smi through an
+    asyncio subprocess) run as tasks on the event loop; plain functions are
+    run in the default thread pool. Deadlines, refresh classes and stale
+    reporting behave exactly as in CollectorScheduler.
+    """
+
+    def __init__(self, collectors: List[Collector], profiler=None):
+        self.collectors: Dict[str, Collector] = {c.name: c for c in collectors}
+        self.profiler = profiler
+
+    def _start(self, c: Collector) -> asyncio.Task:
+        if asyncio.iscoroutinefunction(c.func):
+            coro = c.func()
+            if self.profiler is not None:
+                coro = self.profiler.measure_async(c.name, coro)
+        else:
+            func = c.func
+            if self.profiler is not None:
+                func = self.profiler.wrap(c.name, func)
+            coro = to_thread(func)
+        return asyncio.ensure_future(coro)
+
+    async def collect(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Returns collector name -> value, and the names of stale collectors
+        """
+        start = time.monotonic()
+
+        running: List[Collector] = []
+        for c in self.collectors.values():
+            if not c.is_running():
+                c.harvest()
+                if not c.is_due(start):
+                    continue
+                c.future = self._start(c)
+                c.submitted_at = start
+            running.append(c)
+
+        values: Dict[str, Any] = {
+            c.name: c.last_value for c in self.collectors.values()
+        }
+        stale: List[str] = []
+        for c in running:
+            remaining = max(0, c.submitted_at + c.timeout - time.monotonic())
+            try:
+                # shield: a late run keeps going and is harvested next tick
+                await asyncio.wait_for(asyncio.shield(c.future), timeout=remaining)
+                c.harvest()
+                values[c.name] = c.last_value
+                continue
+            except asyncio.TimeoutError:
+                logger.warning(f"Collector '{c.name}' missed its {c.timeout}s deadline")
+            except Exception as e:
+                logger.error(f"Collector '{c.name}' failed: {e}")
+                c.future = None
+
+            stale.append(c.name)
+
+        return values, stale
+
+    async def shutdown(self) -> None:
+        running = [c.future for c in self.collectors.values() if c.is_running()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+###############################################################################
+## Ticks
+
+
+class Ticker:
+    """
+    Fire on a fixed cadence, free of drift
+
+    Tick k is due at start + k * interval on the monotonic clock, no matter
+    how long the work between two ticks took. The first tick is aligned to
+    a multiple of `interval` on the wall clock, so agents on different
+    machines (with NTP-synced clocks) sample at the same instants. When the
+    work overruns one or more ticks, they are skipped rather than queued.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # time to the next wall-clock multiple of the interval
+        phase = interval - (time.time() % interval)
+        self.start = time.monotonic() + phase
+        self.tick = -1
+
+    def _advance(self) -> Tuple[int, float]:
+        """
+        Move to the next due tick, returns (skipped ticks, seconds until due)
+        """
+        now = time.monotonic()
+        # the first tick index that is not in the past
+        next_tick = max(self.tick + 1, math.ceil((now - self.start) / self.interval))
+        missed = next_tick - self.tick - 1
+        self.tick = next_tick
+        return missed, self.start + next_tick * self.interval - now
+
+    def wait(self) -> int:
+        """
+        Sleep until the next due tick, returns the number of skipped ticks
+        """
+        missed, delay = self._advance()
+        if delay > 0:
+            time.sleep(delay)
+        return missed
+
+    async def wait_async(self) -> int:
+        missed, delay = self._advance()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return missed
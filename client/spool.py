@@ -0,0 +1,155 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from logging import INFO
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+# record header: payload length, crc32 of payload
+HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".seg"
+
+
+class Spool:
+    """
+    A bounded, crash-safe on-disk queue of reports
+
+    Records are appended to numbered segment files; each record is
+    length-prefixed and CRC-checked so a torn write at the tail (power loss,
+    kill -9) is detected and skipped on read. Segments are rolled every
+    `batch_size` records, which makes a segment the unit of upload: a batch
+    is read from the oldest segment and the file is deleted once the server
+    has accepted it.
+
+    The spool behaves as a ring buffer: when the total size exceeds
+    `max_bytes`, or a segment is older than `max_age` seconds, the oldest
+    segments are dropped.
+
+    Appends may come from another thread than the one uploading batches;
+    no lock is held while a batch is being uploaded.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        batch_size: int = 60,
+        max_bytes: int = 64 * 1024**2,
+        max_age: float = 24 * 3600,
+        fsync: bool = True,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync = fsync
+
+        segments = self._segments()
+        self._next_id = int(segments[-1].stem) + 1 if segments else 1
+        # always start a fresh segment, the last one may end in a torn record
+        self._active: Path = None
+        self._active_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(self._read(p)) for p in self._segments())
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.directory.glob("*" + SEGMENT_SUFFIX))
+
+    def _roll(self) -> None:
+        self._active = self.directory / f"{self._next_id:012d}{SEGMENT_SUFFIX}"
+        self._active_count = 0
+        self._next_id += 1
+
+    def is_empty(self) -> bool:
+        return not self._segments()
+
+    def append(self, payload: bytes) -> None:
+        with self._lock:
+            self._append(payload)
+
+    def _append(self, payload: bytes) -> None:
+        if self._active is None or self._active_count >= self.batch_size:
+            self._roll()
+
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with open(self._active, mode="ab") as f:
+            f.write(record)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._active_count += 1
+
+        self._enforce_limits()
+
+    def _enforce_limits(self) -> None:
+        segments = self._segments()
+        now = time.time()
+        total = 0
+        sizes = []
+        for p in segments:
+            stat = p.stat()
+            sizes.append((p, stat.st_size, stat.st_mtime))
+            total += stat.st_size
+
+        for p, size, mtime in sizes:
+            if p == self._active:
+                break
+            if total <= self.max_bytes and now - mtime <= self.max_age:
+                break
+            logger.warning(f"Spool full or expired, dropping {p.name}")
+            p.unlink()
+            total -= size
+
+    @staticmethod
+    def _read(path: Path) -> List[bytes]:
+        """
+        Read the valid records of a segment, stopping at the first bad one
+        """
+        records: List[bytes] = []
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return records
+
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            start = offset + HEADER.size
+            payload = data[start : start + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                logger.warning(f"Spool segment {path.name} truncated at {offset}")
+                break
+            records.append(payload)
+            offset = start + length
+
+        return records
+
+    def batches(self) -> Iterator[Tuple[Path, List[bytes]]]:
+        """
+        Yield (segment, records) from the oldest segment on
+
+        Call ack(segment) once a batch has been delivered.
+        """
+        for p in self._segments():
+            with self._lock:
+                if p == self._active:
+                    # close the active segment so new records go elsewhere
+                    self._active = None
+                records = self._read(p)
+            yield p, records
+
+    def ack(self, segment: Path) -> None:
+        with self._lock:
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
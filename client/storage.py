@@ -0,0 +1,100 @@
+import os
+import time
+from logging import INFO
+from typing import Dict, List, Optional, Tuple
+
+import procfs
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+SECTOR_SIZE = 512  # bytes, /proc/diskstats unit regardless of the device
+MiB = 1024.0**2
+# virtual devices that are never interesting to report
+IGNORED_DEVICE_PREFIXES = ("loop", "ram", "zram")
+
+
+###############################################################################
+## Disk I/O
+
+
+class DiskCollector:
+    """
+    Per-disk throughput, IOPS and utilisation from /proc/diskstats deltas
+
+    Only whole disks are reported (as listed in /sys/block), partitions and
+    loop / ram devices are skipped. The first call only primes the counters.
+    """
+
+    def __init__(self):
+        self._last: Dict[str, Tuple[int, int, int, int, int]] = {}
+        self._last_at: Optional[float] = None
+
+    def rates(self) -> List[dict]:
+        now = time.monotonic()
+        try:
+            counters = procfs.read_diskstats()
+        except OSError:
+            return []
+        last, last_at = self._last, self._last_at
+        self._last, self._last_at = counters, now
+        if last_at is None or now <= last_at:
+            return []
+
+        disks = procfs.read_block_devices()
+        elapsed = now - last_at
+        rates = []
+        for name, values in sorted(counters.items()):
+            if name.startswith(IGNORED_DEVICE_PREFIXES) or name not in last:
+                continue
+            if disks is not None and name not in disks:
+                continue
+            deltas = [v - old for v, old in zip(values, last[name])]
+            # counters reset (device re-attached) or wrapped
+            if any(d < 0 for d in deltas):
+                continue
+            reads, sectors_read, writes, sectors_written, io_ms = deltas
+            rates.append(
+                dict(
+                    name=name,
+                    read_bytes_rate=round(sectors_read * SECTOR_SIZE / elapsed, 1),
+                    write_bytes_rate=round(sectors_written * SECTOR_SIZE / elapsed, 1),
+                    read_iops=round(reads / elapsed, 1),
+                    write_iops=round(writes / elapsed, 1),
+                    busy=round(min(io_ms / 1000 / elapsed, 1.0), 5),
+                )
+            )
+        return rates
+
+
+###############################################################################
+## Filesystems
+
+
+def filesystem_usage(mount_point: str) -> dict:
+    """
+    Capacity of one mounted filesystem, like df
+
+    statvfs() on an unresponsive NFS server can block for a long time, so
+    every mount point gets its own collector (and thread) with a deadline.
+    """
+    try:
+        device, fstype = procfs.read_mounts().get(mount_point, ("", ""))
+    except OSError:
+        device, fstype = "", ""
+
+    st = os.statvfs(mount_point)
+    total = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    # space available to unprivileged users, root reserved blocks excluded
+    free = st.f_bavail * st.f_frsize
+    return dict(
+        mount_point=mount_point,
+        device=device,
+        fstype=fstype,
+        total=round(total / MiB, 1),
+        used=round(used / MiB, 1),
+        free=round(free / MiB, 1),
+        usage=round(used / (used + free), 5) if used + free else None,
+    )
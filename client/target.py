@@ -0,0 +1,309 @@
+import json
+import queue
+import re
+import threading
+import time
+from contextlib import nullcontext
+from logging import INFO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from data_model import MachineStatus
+from delta import DeltaEncoder
+from encoding import PayloadEncoder
+from puts import get_logger
+from spool import Spool
+from transport import Backoff, Transport
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+POST_PATH = "/post"
+DELTA_POST_PATH = "/post/delta"
+BATCH_POST_PATH = "/post/batch"
+SPOOL_BATCHES_PER_SEND = 5
+
+
+###############################################################################
+## Reports
+
+
+class Report:
+    """
+    One collected status, serialised at most once per payload format
+
+    A report is shared by every target: the dict, the JSON used for the
+    spool and each (format, compression) encoding are computed by the first
+    target that needs them and reused by the others.
+    """
+
+    def __init__(self, status: MachineStatus):
+        self.status = status
+        self._lock = threading.Lock()
+        self._dict: Optional[dict] = None
+        self._json: Optional[bytes] = None
+        self._encoded: Dict[Tuple[str, str], bytes] = {}
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            if self._dict is None:
+                self._dict = dict(self.status.dict())
+            return self._dict
+
+    def as_json(self) -> bytes:
+        with self._lock:
+            if self._json is None:
+                self._json = self.status.json().encode("utf-8")
+            return self._json
+
+    def encode(self, encoder: PayloadEncoder) -> bytes:
+        status = self.as_dict()
+        key = (encoder.fmt, encoder.compression)
+        with self._lock:
+            data = self._encoded.get(key)
+            if data is None:
+                data = self._encoded[key] = encoder.encode(status)
+            return data
+
+
+###############################################################################
+## Targets
+
+
+def spool_name(server: str) -> str:
+    """
+    A directory name for a server URL, e.g. http://10.0.0.1:8000 -> 10.0.0.1_8000
+    """
+    name = re.sub(r"^[a-z]+://", "", server)
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", name).strip("_") or "default"
+
+
+class Target:
+    """
+    One server to report to, with its own connection, backoff and spool
+
+    Payload format fallback and the delta baseline are per target too, since
+    each server negotiates them independently. Reports are handed over with
+    submit() and sent by the target's own thread from a bounded queue, so
+    a slow or unreachable server never delays the collection nor the other
+    targets. When the queue overflows, the oldest report is spooled.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        machine_name: str,
+        spool: Spool,
+        transport: Transport,
+        payload_encoder: PayloadEncoder,
+        delta_encoder: DeltaEncoder = None,
+        queue_size: int = 4,
+        profiler=None,
+    ):
+        self.server = server
+        self.machine_name = machine_name
+        self.spool = spool
+        self.transport = transport
+        self.payload_encoder = payload_encoder
+        self.delta_encoder = delta_encoder
+        self.profiler = profiler
+        # seconds spent sending the previous report
+        self.send_time: Optional[float] = None
+
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    def _measure(self, name: str):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.measure(name)
+
+    def _post(self, report: Report) -> Optional[requests.Response]:
+        path = POST_PATH
+        if self.delta_encoder is not None:
+            # patches depend on what this server already holds
+            path = DELTA_POST_PATH
+            with self._measure("serialise"):
+                data = self.payload_encoder.encode(
+                    self.delta_encoder.encode(report.as_dict())
+                )
+        else:
+            with self._measure("serialise"):
+                data = report.encode(self.payload_encoder)
+        with self._measure("send"):
+            return self.transport.post(
+                path, data=data, headers=self.payload_encoder.headers()
+            )
+
+    def send(self, report: Report) -> bool:
+        r = self._post(report)
+        if r is not None and r.status_code == 409 and self.delta_encoder is not None:
+            # the server is fine, it just needs a new baseline: send this
+            # report as one right away rather than spooling it
+            logger.info(f"{self.server} requested a full resync")
+            self.delta_encoder.reset()
+            r = self._post(report)
+
+        if r is None or r.status_code != 201:
+            if r is None:
+                self.transport.failed()
+            elif r.status_code == 415 and self.payload_encoder.fallback():
+                logger.warning(
+                    f"{self.server} rejected the payload encoding, using JSON"
+                )
+            else:
+                logger.error(f"{self.server} status_code: {r.status_code}")
+                self.transport.failed()
+            # the server may or may not have applied it, start over from a baseline
+            if self.delta_encoder is not None:
+                self.delta_encoder.reset()
+            return False
+        else:
+            self.transport.succeeded()
+            return True
+
+    def drain_spool(self) -> None:
+        """
+        Upload spooled reports, one segment per request, oldest first
+        """
+        for n, (segment, records) in enumerate(self.spool.batches()):
+            if n >= SPOOL_BATCHES_PER_SEND:
+                break
+            if records:
+                # records are JSON already, splice them instead of re-encoding
+                body = (
+                    b'{"name": '
+                    + json.dumps(self.machine_name).encode("utf-8")
+                    + b', "statuses": ['
+                    + b", ".join(records)
+                    + b"]}"
+                )
+                data, headers = self.payload_encoder.encode_json(body)
+                r = self.transport.post(BATCH_POST_PATH, data=data, headers=headers)
+                if r is None or r.status_code != 201:
+                    if r is not None:
+                        logger.error(f"{self.server} status_code: {r.status_code}")
+                    self.transport.failed()
+                    return
+                logger.info(f"Uploaded {len(records)} spooled reports to {self.server}")
+            self.spool.ack(segment)
+
+    def deliver(self, report: Report) -> None:
+        """
+        Send a report now, or spool it while the server is backing off
+        """
+        # keep sampling while backing off, the spool fills the gap
+        if not self.transport.backoff.ready():
+            self.spool.append(report.as_json())
+            return
+
+        start = time.monotonic()
+        try:
+            successful = self.send(report)
+        except Exception as e:
+            logger.error(e)
+            self.transport.failed()
+            successful = False
+        self.send_time = round(time.monotonic() - start, 5)
+
+        if successful:
+            print("201 OK")
+            if not self.spool.is_empty():
+                self.drain_spool()
+        else:
+            self.spool.append(report.as_json())
+
+    ###########################################################################
+    ## Sender Thread
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name=f"sender-{spool_name(self.server)}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, report: Report) -> None:
+        """
+        Queue a report for the sender thread, never blocks
+        """
+        while True:
+            try:
+                self.queue.put_nowait(report)
+                return
+            except queue.Full:
+                pass
+            try:
+                evicted = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            self.queue.task_done()
+            logger.warning(f"Uploads to {self.server} are behind, spooling a report")
+            self.spool.append(evicted.as_json())
+
+    def _run(self) -> None:
+        while True:
+            report = self.queue.get()
+            try:
+                self.deliver(report)
+            except Exception as e:
+                logger.error(e)
+            finally:
+                self.queue.task_done()
+
+    def pending(self) -> List[Report]:
+        reports = []
+        while True:
+            try:
+                report = self.queue.get_nowait()
+            except queue.Empty:
+                return reports
+            self.queue.task_done()
+            reports.append(report)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def make_targets(
+    servers: List[str],
+    machine_name: str,
+    spool_dir: Path,
+    payload_format: str,
+    compression: str,
+    delta: bool,
+    backoff_base: float,
+    backoff_cap: float,
+    connect_timeout: float,
+    read_timeout: float,
+    spool_max_bytes: int,
+    spool_max_age: float,
+    queue_size: int,
+    profiler=None,
+) -> List[Target]:
+    targets = []
+    for server in servers:
+        # a single server keeps using the spool directory itself
+        directory = spool_dir
+        if len(servers) > 1:
+            directory = spool_dir / spool_name(server)
+        targets.append(
+            Target(
+                server,
+                machine_name,
+                spool=Spool(
+                    directory, max_bytes=spool_max_bytes, max_age=spool_max_age
+                ),
+                transport=Transport(
+                    server,
+                    connect_timeout=connect_timeout,
+                    read_timeout=read_timeout,
+                    backoff=Backoff(base=backoff_base, cap=backoff_cap),
+                ),
+                payload_encoder=PayloadEncoder(payload_format, compression),
+                delta_encoder=DeltaEncoder(machine_name) if delta else None,
+                queue_size=queue_size,
+                profiler=profiler,
+            )
+        )
+    return targets
@@ -0,0 +1,197 @@
+import errno
+import os
+import re
+from logging import INFO
+from pathlib import Path
+from typing import List, Optional
+
+import procfs
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+# hwmon chips that measure the CPU package / cores
+CPU_CHIPS = {"coretemp", "k10temp", "zenpower", "cpu_thermal", "soc_thermal"}
+# sysfs attributes are short, one read of this size returns the whole value
+READ_SIZE = 32
+
+# read errors meaning the device is gone for good
+GONE = {errno.ENODEV, errno.ENXIO, errno.ENOENT}
+
+SENSOR_INPUT = re.compile(r"^(temp|fan)(\d+)_input$")
+
+
+###############################################################################
+## Sensors
+
+
+class Sensor:
+    """
+    One hwmon input attribute, kept open for the life of the agent
+
+    sysfs regenerates an attribute's value on every read from offset 0, so
+    a pread() on the open descriptor is all that is needed per tick: no
+    path lookup, open() or close().
+    """
+
+    __slots__ = ("kind", "chip", "label", "path", "fd", "high", "critical")
+
+    def __init__(
+        self,
+        kind: str,
+        chip: str,
+        label: str,
+        path: Path,
+        high: Optional[float] = None,
+        critical: Optional[float] = None,
+    ):
+        self.kind = kind  # "temp" | "fan"
+        self.chip = chip
+        self.label = label
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        # thresholds are static, read once at discovery
+        self.high = high
+        self.critical = critical
+
+    def read(self) -> int:
+        return int(os.pread(self.fd, READ_SIZE, 0))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _read_value(path: Path) -> Optional[int]:
+    try:
+        return int(procfs.read_text(path))
+    except (OSError, ValueError):
+        return None
+
+
+def _millidegrees(value: Optional[int]) -> Optional[float]:
+    return None if value is None else value / 1000
+
+
+def discover(hwmon_root: Path) -> List[Sensor]:
+    """
+    Open every temperature and fan input under /sys/class/hwmon
+    """
+    sensors: List[Sensor] = []
+    try:
+        chip_dirs = sorted(hwmon_root.iterdir())
+    except OSError:
+        return sensors
+
+    for chip_dir in chip_dirs:
+        try:
+            chip = procfs.read_text(chip_dir / "name").strip()
+        except OSError:
+            continue
+        # older drivers keep the attributes in the device directory
+        for attr_dir in (chip_dir, chip_dir / "device"):
+            try:
+                names = os.listdir(attr_dir)
+            except OSError:
+                continue
+            inputs = []
+            for name in names:
+                match = SENSOR_INPUT.match(name)
+                if match is not None:
+                    inputs.append((match.group(1), int(match.group(2)), name))
+            # temp1, temp2, ..., temp10 rather than temp1, temp10, temp2
+            for kind, n, name in sorted(inputs):
+                prefix = attr_dir / f"{kind}{n}"
+                try:
+                    label = procfs.read_text(Path(f"{prefix}_label")).strip()
+                except OSError:
+                    label = f"{kind}{n}"
+                high = critical = None
+                if kind == "temp":
+                    high = _millidegrees(_read_value(Path(f"{prefix}_max")))
+                    critical = _millidegrees(_read_value(Path(f"{prefix}_crit")))
+                try:
+                    sensors.append(
+                        Sensor(kind, chip, label, attr_dir / name, high, critical)
+                    )
+                except OSError as e:
+                    logger.warning(f"Cannot open {attr_dir / name}: {e}")
+
+    return sensors
+
+
+###############################################################################
+## Collector
+
+
+class ThermalCollector:
+    """
+    Temperatures and fan speeds from hwmon
+
+    Sensors are discovered once (on the first collection, so that a fixture
+    root set with procfs.set_root is honoured); every later collection only
+    preads the already open attributes. A sensor whose device is gone (e.g.
+    hot-unplugged) is closed and dropped.
+    """
+
+    def __init__(self, hwmon_root: Path = None):
+        self.hwmon_root = hwmon_root
+        self.sensors: Optional[List[Sensor]] = None
+
+    def discover(self) -> None:
+        self.close()
+        hwmon_root = self.hwmon_root or procfs.SYS_ROOT / "class" / "hwmon"
+        self.sensors = discover(hwmon_root)
+        logger.info(f"Discovered {len(self.sensors)} hwmon sensors")
+
+    def collect(self) -> dict:
+        if self.sensors is None:
+            self.discover()
+
+        temperatures = []
+        fans = []
+        cpu_temperature = None
+        alive: List[Sensor] = []
+        for sensor in self.sensors:
+            try:
+                value = sensor.read()
+            except OSError as e:
+                if e.errno in GONE:
+                    logger.warning(f"Dropping sensor {sensor.path}: {e}")
+                    sensor.close()
+                    continue
+                # e.g. ENODATA / EIO, transient on some chips: skip a reading
+                value = None
+            except ValueError:
+                value = None
+            alive.append(sensor)
+            if value is None:
+                continue
+
+            if sensor.kind == "fan":
+                fans.append(dict(chip=sensor.chip, label=sensor.label, rpm=value))
+                continue
+
+            temperature = value / 1000
+            temperatures.append(
+                dict(
+                    chip=sensor.chip,
+                    label=sensor.label,
+                    temperature=temperature,
+                    high=sensor.high,
+                    critical=sensor.critical,
+                )
+            )
+            if sensor.chip in CPU_CHIPS:
+                if cpu_temperature is None or temperature > cpu_temperature:
+                    cpu_temperature = temperature
+
+        self.sensors = alive
+        return dict(
+            cpu_temperature=cpu_temperature, temperatures=temperatures, fans=fans
+        )
+
+    def close(self) -> None:
+        for sensor in self.sensors or []:
+            sensor.close()
+        self.sensors = None
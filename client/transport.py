@@ -0,0 +1,99 @@
+import random
+import time
+from logging import INFO
+from typing import Dict, Optional
+
+import requests
+from puts import get_logger
+from requests.adapters import HTTPAdapter
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+
+class Backoff:
+    """
+    Capped exponential backoff with full jitter
+
+    After n consecutive failures the next delay is drawn uniformly from
+    [0, min(cap, base * 2 ** n)], so a whole lab does not reconnect in
+    lock-step after a server restart.
+    """
+
+    def __init__(self, base: float = 1.0, cap: float = 300.0):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+        # monotonic time before which no new attempt should be made
+        self.retry_at = 0.0
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def fail(self) -> None:
+        self.failures += 1
+        self.retry_at = time.monotonic() + self.delay()
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def delay(self) -> float:
+        if self.failures == 0:
+            return 0.0
+        # clamp the exponent so 2 ** n does not grow without bound
+        ceiling = min(self.cap, self.base * 2 ** min(self.failures, 32))
+        return random.uniform(0, ceiling)
+
+
+class Transport:
+    """
+    A persistent, pooled HTTP(S) session to one server
+
+    The TCP (and TLS) connection is kept alive across reports. Every request
+    has explicit connect / read timeouts, and reachability is inferred from
+    the outcome of the report itself instead of a separate probe.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        backoff: Backoff = None,
+    ):
+        self.server = server.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.backoff = backoff or Backoff()
+
+        self.session = requests.Session()
+        # one host, at most a couple of connections, no silent retries
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path: str) -> str:
+        return self.server + path
+
+    def post(
+        self, path: str, data: bytes, headers: Dict[str, str]
+    ) -> Optional[requests.Response]:
+        """
+        POST and return the response, or None if the server is unreachable
+        """
+        try:
+            return self.session.post(
+                self.url(path), data=data, headers=headers, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Server unreachable: {e}")
+            return None
+
+    def succeeded(self) -> None:
+        self.backoff.reset()
+
+    def failed(self) -> None:
+        self.backoff.fail()
+
+    def close(self) -> None:
+        self.session.close()
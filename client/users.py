@@ -0,0 +1,206 @@
+import os
+import struct
+import subprocess
+import time
+from logging import INFO
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import procfs
+from puts import get_logger
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+SUBPROCESS_TIMEOUT = 10  # seconds
+
+###############################################################################
+## /etc/passwd
+
+
+class PasswdCache:
+    """
+    Parse /etc/passwd only when it changes (mtime, inode or size)
+
+    Ref: https://askubuntu.com/a/725122
+
+    /etc/passwd contains one line for each user account, with seven fields
+    delimited by colons (“:”). These fields are:
+
+    0 - login name
+    1 - optional encrypted password
+    2 - numerical user ID
+    3 - numerical group ID
+    4 - user name or comment field
+    5 - user home directory
+    6 - optional user command interpreter
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = path
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self.uid_names: Dict[int, str] = {}
+        # regular (human) accounts
+        self.users: Set[str] = set()
+        self.sorted_users: List[str] = []
+
+    def refresh(self) -> None:
+        path = self.path or procfs.ETC_ROOT / "passwd"
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._signature = None
+            self.uid_names = {}
+            self.users = set()
+            self.sorted_users = []
+            return
+
+        signature = (st.st_mtime_ns, st.st_ino, st.st_size)
+        if signature == self._signature:
+            return
+
+        uid_names: Dict[int, str] = {}
+        users: Set[str] = set()
+        with open(path, mode="r") as f:
+            for line in f:
+                user_data = line.strip().split(":")
+                if len(user_data) < 3:
+                    continue
+                try:
+                    uid = int(user_data[2])
+                except ValueError:
+                    continue
+                uid_names[uid] = user_data[0]
+                if 1000 <= uid <= 60000:
+                    users.add(user_data[0])
+
+        self.uid_names = uid_names
+        self.users = users
+        self.sorted_users = sorted(users)
+        self._signature = signature
+
+
+###############################################################################
+## utmp
+
+# struct utmp from <utmp.h> (glibc, Linux): 384 bytes
+UTMP_STRUCT = struct.Struct("<hhi32s4s32s256shhiii16s20s")
+USER_PROCESS = 7
+
+
+def _cstr(value: bytes) -> str:
+    return value.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+
+def read_utmp(path: Path) -> List[Tuple[str, str, int]]:
+    """
+    (user, tty line, pid) of the live login sessions recorded in utmp
+    """
+    with open(path, mode="rb") as f:
+        data = f.read()
+
+    sessions = []
+    for offset in range(0, len(data) - UTMP_STRUCT.size + 1, UTMP_STRUCT.size):
+        record = UTMP_STRUCT.unpack_from(data, offset)
+        ut_type, ut_pid, ut_line, ut_user = record[0], record[2], record[3], record[5]
+        if ut_type != USER_PROCESS:
+            continue
+        user = _cstr(ut_user)
+        if not user:
+            continue
+        # skip stale entries left by sessions that died without logout,
+        # like `users` does
+        try:
+            os.kill(ut_pid, 0)
+        except ProcessLookupError:
+            continue
+        except PermissionError:
+            pass
+        sessions.append((user, _cstr(ut_line), ut_pid))
+
+    return sessions
+
+
+def _tty_idle(line: str, now: float) -> Optional[float]:
+    """
+    Seconds since the last input on a tty, like `w` (atime of the device)
+    """
+    if not line:
+        return None
+    try:
+        return max(0.0, now - os.stat(Path("/dev") / line).st_atime)
+    except OSError:
+        return None
+
+
+def _online_users_from_command() -> List[str]:
+    completed_proc = subprocess.run(
+        "users",
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        timeout=SUBPROCESS_TIMEOUT,
+    )
+    if completed_proc.returncode != 0:
+        return []
+
+    output = completed_proc.stdout.decode("utf-8").strip()
+    return output.split()
+
+
+###############################################################################
+## Collector
+
+
+class UsersCollector:
+    """
+    All / online / offline users plus per-user session count and idle time
+
+    Online sessions are read natively from utmp; the `users` command is only
+    used as a fallback where there is no utmp file (it cannot tell sessions
+    or idle time). /etc/passwd is re-parsed only when it changes.
+    """
+
+    def __init__(self, utmp_path: Path = None):
+        self.utmp_path = utmp_path
+        self.passwd = PasswdCache()
+
+    def _sessions(self) -> List[Tuple[str, str, int]]:
+        utmp_path = self.utmp_path or procfs.RUN_ROOT / "utmp"
+        try:
+            return read_utmp(utmp_path)
+        except FileNotFoundError:
+            return [(user, "", 0) for user in _online_users_from_command()]
+
+    def collect(self) -> dict:
+        self.passwd.refresh()
+        sessions = self._sessions()
+        now = time.time()
+
+        session_counts: Dict[str, int] = {}
+        idle: Dict[str, Optional[float]] = {}
+        for user, line, _ in sessions:
+            session_counts[user] = session_counts.get(user, 0) + 1
+            tty_idle = _tty_idle(line, now)
+            if tty_idle is not None:
+                # a user is as idle as their most recently active session
+                idle[user] = min(idle.get(user, tty_idle), tty_idle)
+
+        online = set(session_counts)
+        # sorted once per /etc/passwd change, this runs every tick
+        all_users = self.passwd.sorted_users
+
+        return dict(
+            users_info={
+                "all_users": all_users,
+                "online_users": sorted(online),
+                "offline_users": [user for user in all_users if user not in online],
+            },
+            user_sessions=[
+                dict(
+                    user=user,
+                    sessions=count,
+                    idle=round(idle[user], 1) if user in idle else None,
+                )
+                for user, count in sorted(session_counts.items())
+            ],
+        )
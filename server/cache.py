@@ -0,0 +1,238 @@
+import gzip
+import os
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .encoding import CBOR, JSON, MSGPACK, encode, encode_map, negotiate_content_type
+
+###############################################################################
+## Constants
+
+GZIP_LEVEL = 6  # GZipMiddleware uses 9, much slower for little gain on JSON
+MIN_GZIP_SIZE = 1000  # same threshold as GZipMiddleware
+# short names in ETags, one per representation
+FORMAT_TAGS = {JSON: "json", MSGPACK: "msgpack", CBOR: "cbor"}
+MAX_BODIES = 32  # assembled bodies kept, e.g. distinct (machines, fields) queries
+MAX_PROJECTIONS = 8  # encodings kept per machine, one per (fields, format)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        params = params.strip().lower()
+        q = 1.0
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[coding.strip().lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag[2:] if etag.startswith("W/") else etag
+    for item in if_none_match.split(","):
+        item = item.strip()
+        if (item[2:] if item.startswith("W/") else item) == tag:
+            return True
+    return False
+
+
+def _bounded_put(cache: dict, key: Any, value: Any, size: int) -> None:
+    if key not in cache and len(cache) >= size:
+        # dicts keep insertion order: drop the oldest entry
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+###############################################################################
+## Field Projection
+
+
+def canonical_fields(fields: Optional[str]) -> Optional[str]:
+    """
+    A comma-separated field list, sorted and deduplicated (None: all fields)
+    """
+    fields = sorted({field.strip() for field in (fields or "").split(",")} - {""})
+    return ",".join(fields) or None
+
+
+def parse_fields(fields: str) -> dict:
+    """
+    "cpu_usage,gpu_status.gpu_usage"
+        -> {"cpu_usage": None, "gpu_status": {"gpu_usage": None}}
+
+    None means the whole value; a whole field wins over its subfields.
+    """
+    projection: dict = {}
+    for field in fields.split(","):
+        node = projection
+        *parents, leaf = field.split(".")
+        for part in parents:
+            if part in node and node[part] is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = None
+    return projection
+
+
+def project(value: Any, projection: Optional[dict]) -> Any:
+    """
+    Keep only the projected fields; lists are projected item by item
+    """
+    if projection is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, projection) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: project(value[key], sub)
+            for key, sub in projection.items()
+            if key in value
+        }
+    return value
+
+
+###############################################################################
+## Status Cache
+
+
+class StatusCache:
+    """
+    Encoded statuses of every machine, for /get and /stream
+
+    Each machine's status is encoded once per (fields, format) after it
+    changes, and response bodies are spliced from these per-machine
+    encodings with encode_map: a report re-encodes one machine, not all of
+    them, and a filtered / projected query only costs a join. Assembled
+    bodies (and their gzip variants) are kept as well until one of their
+    machines changes.
+
+    Every change takes a new version from a single counter; a response's
+    ETag carries the newest version among its machines plus a per-process
+    token, so it never repeats across restarts or workers, and pollers get a
+    304 until one of their machines changes. Projected responses also carry
+    a hash of their (canonical) fields, so a client switching between
+    projections never gets a 304 for the other one.
+    """
+
+    def __init__(self, statuses: Dict[str, dict]):
+        self.statuses = statuses
+        self._token = os.urandom(4).hex()
+        self._counter = 0
+        self._floor = 0  # version of every machine as of the last invalidate()
+        self._versions: Dict[str, int] = {}
+        self._machines: Dict[str, Dict[Tuple[Optional[str], str], bytes]] = {}
+        self._bodies: Dict[tuple, Tuple[int, bytes]] = {}
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Forget the encodings of a machine (default: of every machine)
+        """
+        self._counter += 1
+        if name is None:
+            self._floor = self._counter
+            self._versions.clear()
+            self._machines.clear()
+        else:
+            self._versions[name] = self._counter
+            self._machines.pop(name, None)
+
+    def version(self, names: Optional[Tuple[str, ...]] = None) -> int:
+        if names is None:
+            return self._counter
+        return max([self._floor] + [self._versions.get(name, 0) for name in names])
+
+    def etag(
+        self,
+        names: Optional[Tuple[str, ...]],
+        fields: Optional[str],
+        content_type: str,
+    ) -> str:
+        tag = f"{self._token}-{self.version(names)}-{FORMAT_TAGS[content_type]}"
+        if fields is not None:
+            # a projection is a different representation of the same version
+            tag += f"-{zlib.crc32(fields.encode()):08x}"
+        return f'W/"{tag}"'
+
+    def machine(
+        self, name: str, fields: Optional[str] = None, content_type: str = JSON
+    ) -> bytes:
+        """
+        One machine's status, projected to `fields` (canonical_fields)
+        """
+        cache = self._machines.setdefault(name, {})
+        data = cache.get((fields, content_type))
+        if data is None:
+            status = self.statuses[name]
+            if fields is not None:
+                status = project(status, parse_fields(fields))
+            data = encode(status, content_type)
+            _bounded_put(cache, (fields, content_type), data, MAX_PROJECTIONS)
+        return data
+
+    def encoded(
+        self,
+        names: Optional[Tuple[str, ...]] = None,
+        fields: Optional[str] = None,
+        content_type: str = JSON,
+        gzipped: bool = False,
+    ) -> bytes:
+        """
+        {name: status} of the given machines (default: all)
+        """
+        key = (names, fields, content_type, gzipped)
+        version = self.version(names)
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        if gzipped:
+            data = gzip.compress(self.encoded(names, fields, content_type), GZIP_LEVEL)
+        else:
+            data = encode_map(
+                [
+                    (name, self.machine(name, fields, content_type))
+                    for name in (self.statuses if names is None else names)
+                ],
+                content_type,
+            )
+        _bounded_put(self._bodies, key, (version, data), MAX_BODIES)
+        return data
+
+    def response(
+        self,
+        request: Request,
+        names: Optional[Tuple[str, ...]] = None,
+        fields: Optional[str] = None,
+    ) -> Response:
+        content_type = negotiate_content_type(request.headers.get("accept"))
+        etag = self.etag(names, fields, content_type)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        data = self.encoded(names, fields, content_type)
+        if len(data) >= MIN_GZIP_SIZE and accepts_gzip(
+            request.headers.get("accept-encoding")
+        ):
+            # already compressed, GZipMiddleware leaves it alone
+            data = self.encoded(names, fields, content_type, gzipped=True)
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=data, media_type=content_type, headers=headers)
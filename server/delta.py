@@ -0,0 +1,35 @@
+from typing import Any, Dict, List, Optional
+
+from .data_model import ItemsPatch
+
+
+def merge_items(items: List[dict], patch: ItemsPatch) -> List[dict]:
+    """
+    Apply an item patch (see client/delta.py) to a list of status items
+
+    Patched items are merged into the item with the same key, the others are
+    new; items the patch leaves out were removed.
+    """
+    known = {
+        tuple(item.get(field) for field in patch.key): item
+        for item in items
+        if isinstance(item, dict)
+    }
+    return [
+        {**known.get(tuple(item.get(field) for field in patch.key), {}), **item}
+        for item in patch.items
+    ]
+
+
+def expand_patch(status: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn the item patches of a delta patch into whole lists, against the
+    machine's current status; other fields are left as they are
+    """
+    expanded = {}
+    for field, value in patch.items():
+        if isinstance(value, dict) and set(value) == {"key", "items"}:
+            current: Optional[list] = status.get(field)
+            value = merge_items(current or [], ItemsPatch.parse_obj(value))
+        expanded[field] = value
+    return expanded
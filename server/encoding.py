@@ -0,0 +1,235 @@
+import json
+import struct
+import zlib
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional
+    cbor2 = None
+
+###############################################################################
+## Constants
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# largest request body accepted once decompressed, a /post/batch of a full
+# spool segment (60 reports) is around 1 MiB
+MAX_BODY_SIZE = 16 * 1024**2
+# zlib window bits per Content-Encoding: gzip header, zlib header
+WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+# alternative spellings seen in the wild
+CONTENT_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+###############################################################################
+## Codecs
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def _primitive(obj: Any) -> Any:
+    # cbor2 refuses naive datetimes, send them as ISO strings like JSON does
+    if isinstance(obj, dict):
+        return {k: _primitive(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_primitive(v) for v in obj]
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return obj
+
+
+def supported_content_types() -> list:
+    content_types = [JSON]
+    if msgpack is not None:
+        content_types.append(MSGPACK)
+    if cbor2 is not None:
+        content_types.append(CBOR)
+    return content_types
+
+
+def normalize_content_type(content_type: Optional[str]) -> str:
+    if not content_type:
+        return JSON
+    content_type = content_type.split(";")[0].strip().lower()
+    return CONTENT_TYPE_ALIASES.get(content_type, content_type)
+
+
+def encode(obj: Any, content_type: str = JSON) -> bytes:
+    content_type = normalize_content_type(content_type)
+    if content_type == MSGPACK and msgpack is not None:
+        return msgpack.packb(obj, default=_default)
+    if content_type == CBOR and cbor2 is not None:
+        return cbor2.dumps(_primitive(obj))
+    if content_type == JSON:
+        return json.dumps(obj, default=_default).encode("utf-8")
+    raise HTTPException(status_code=415, detail=f"Unsupported: {content_type}")
+
+
+def _cbor_map_header(size: int) -> bytes:
+    # major type 5, with the size as the additional information
+    if size < 24:
+        return bytes([0xA0 | size])
+    if size < 0x100:
+        return struct.pack(">BB", 0xB8, size)
+    if size < 0x10000:
+        return struct.pack(">BH", 0xB9, size)
+    return struct.pack(">BI", 0xBA, size)
+
+
+def encode_map(items: List[Tuple[str, bytes]], content_type: str = JSON) -> bytes:
+    """
+    Encode a map whose values are already encoded, without re-encoding them
+    """
+    content_type = normalize_content_type(content_type)
+    if content_type == MSGPACK and msgpack is not None:
+        parts = [msgpack.Packer().pack_map_header(len(items))]
+        for key, value in items:
+            parts += (msgpack.packb(key), value)
+        return b"".join(parts)
+    if content_type == CBOR and cbor2 is not None:
+        parts = [_cbor_map_header(len(items))]
+        for key, value in items:
+            parts += (cbor2.dumps(key), value)
+        return b"".join(parts)
+    if content_type == JSON:
+        return (
+            b"{"
+            + b", ".join(
+                json.dumps(key).encode("utf-8") + b": " + value for key, value in items
+            )
+            + b"}"
+        )
+    raise HTTPException(status_code=415, detail=f"Unsupported: {content_type}")
+
+
+def decode(data: bytes, content_type: str = JSON) -> Any:
+    content_type = normalize_content_type(content_type)
+    if content_type == MSGPACK and msgpack is not None:
+        return msgpack.unpackb(data)
+    if content_type == CBOR and cbor2 is not None:
+        return cbor2.loads(data)
+    if content_type == JSON or content_type.endswith("+json"):
+        return json.loads(data)
+    raise HTTPException(status_code=415, detail=f"Unsupported: {content_type}")
+
+
+def decompress(data: bytes, content_encoding: Optional[str]) -> bytes:
+    """
+    Inflate a request body, refusing more than MAX_BODY_SIZE bytes of output
+    (a few KiB of gzip can expand to gigabytes)
+    """
+    content_encoding = (content_encoding or "identity").strip().lower()
+    if content_encoding == "identity":
+        body = data
+    elif content_encoding in WBITS:
+        inflater = zlib.decompressobj(WBITS[content_encoding])
+        try:
+            # one byte over the limit tells a full body from a truncated one
+            body = inflater.decompress(data, MAX_BODY_SIZE + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid body: {e}")
+        if len(body) <= MAX_BODY_SIZE and not inflater.eof:
+            raise HTTPException(status_code=400, detail="Invalid body: truncated")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported: {content_encoding}")
+    if len(body) > MAX_BODY_SIZE:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return body
+
+
+def negotiate_content_type(accept: Optional[str]) -> str:
+    """
+    Pick the first supported binary type listed in the Accept header, else JSON
+    """
+    if not accept:
+        return JSON
+    supported = supported_content_types()
+    for item in accept.split(","):
+        content_type = normalize_content_type(item)
+        if content_type in supported:
+            return content_type
+    return JSON
+
+
+def encoded_response(obj: Any, request: Request, status_code: int = 200) -> Response:
+    """
+    Encode `obj` in the format requested by the Accept header
+
+    Compression is left to GZipMiddleware, which honours Accept-Encoding.
+    """
+    content_type = negotiate_content_type(request.headers.get("accept"))
+    return Response(
+        content=encode(obj, content_type),
+        status_code=status_code,
+        media_type=content_type,
+    )
+
+
+###############################################################################
+## Request Decoding
+
+
+class DecodingRequest(Request):
+    """
+    A request whose body may be compressed (Content-Encoding: gzip / deflate)
+    and/or binary (Content-Type: application/msgpack / application/cbor)
+    """
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_decoded_body"):
+            body = await super().body()
+            encoding = self.headers.get("content-encoding")
+            self._decoded_body = decompress(body, encoding)
+        return self._decoded_body
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            content_type = self.scope.get("body_content_type", JSON)
+            self._json = decode(body, content_type)
+        return self._json
+
+
+class DecodingRoute(APIRoute):
+    """
+    Let FastAPI validate msgpack / cbor bodies exactly like JSON ones
+    """
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            # FastAPI only calls request.json() for JSON content types, so
+            # remember the real one and present the body as JSON
+            headers = []
+            for key, value in request.scope["headers"]:
+                if key == b"content-type":
+                    request.scope["body_content_type"] = value.decode("latin-1")
+                    value = JSON.encode("latin-1")
+                headers.append((key, value))
+            request.scope["headers"] = headers
+
+            request = DecodingRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return route_handler
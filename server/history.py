@@ -0,0 +1,210 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+###############################################################################
+## Constants
+
+HISTORY_RETENTION = 24 * 3600  # seconds
+HISTORY_STEP = 5  # seconds per slot, the finest resolution kept
+# e.g. CPU + RAM + 16 GPUs x 3, caps memory per machine whatever is posted
+MAX_METRICS_PER_MACHINE = 2 + 16 * 3
+MAX_POINTS = 1000  # buckets per /history response
+DEFAULT_POINTS = 300
+
+GPU_METRICS = ("gpu_usage", "memory_usage", "temperature")
+
+
+def extract_metrics(status: dict) -> Dict[str, Optional[float]]:
+    """
+    The numeric metrics kept in history, from a MachineStatus dict
+
+    GPU metrics are named "gpu<index>.<field>", e.g. "gpu3.gpu_usage".
+    """
+    metrics = {
+        "cpu_usage": status.get("cpu_usage"),
+        "ram_usage": status.get("ram_usage"),
+    }
+    for gpu in status.get("gpu_status") or []:
+        if gpu.get("index") is None:
+            continue
+        for field in GPU_METRICS:
+            metrics[f"gpu{gpu['index']}.{field}"] = gpu.get(field)
+    return metrics
+
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    # NaN (no sample in the bucket) becomes null in JSON
+    return [None if math.isnan(v) else round(v, 5) for v in values.tolist()]
+
+
+###############################################################################
+## Ring Buffers
+
+
+class MachineHistory:
+    """
+    Fixed-size, time-indexed ring buffers of one machine's metrics
+
+    Time is cut into `step`-second slots; slot s lives at position
+    s % capacity of every buffer, and `slots` records which absolute slot a
+    position currently holds, so stale positions from a previous lap are
+    told apart from fresh ones without ever clearing the whole ring. This
+    makes out-of-order writes (e.g. spooled reports uploaded after an
+    outage) as cheap as in-order ones. Several reports within one slot keep
+    the last value.
+
+    Memory is allocated up front per metric: capacity * 4 bytes (float32)
+    per metric plus capacity * 8 bytes for the slot index.
+    """
+
+    def __init__(self, capacity: int, step: float):
+        self.capacity = capacity
+        self.step = step
+        self.slots = np.full(capacity, -1, dtype=np.int64)
+        self.metrics: Dict[str, np.ndarray] = {}
+        self.newest_slot = -1
+
+    def record(self, timestamp: float, values: Dict[str, Optional[float]]) -> bool:
+        slot = int(timestamp // self.step)
+        if slot <= self.newest_slot - self.capacity:
+            # older than the retention window
+            return False
+        pos = slot % self.capacity
+        if self.slots[pos] != slot:
+            # the position held a slot from a previous lap
+            for buffer in self.metrics.values():
+                buffer[pos] = np.nan
+            self.slots[pos] = slot
+        self.newest_slot = max(self.newest_slot, slot)
+
+        for name, value in values.items():
+            buffer = self.metrics.get(name)
+            if buffer is None:
+                if len(self.metrics) >= MAX_METRICS_PER_MACHINE:
+                    continue
+                buffer = self.metrics[name] = np.full(
+                    self.capacity, np.nan, dtype=np.float32
+                )
+            buffer[pos] = np.nan if value is None else value
+        return True
+
+    def query(
+        self, names: List[str], start: float, end: float, resolution: float
+    ) -> dict:
+        """
+        min / mean / max of each metric per `resolution`-second bucket
+
+        Buckets start at `start`; empty buckets are null.
+        """
+        n_buckets = max(1, math.ceil((end - start) / resolution))
+        first = max(math.ceil(start / self.step), self.newest_slot - self.capacity + 1)
+        # only slots that can hold data: a far-off `end` must not size the scan
+        last = min(math.floor(end / self.step), self.newest_slot)
+        first = min(first, last + 1)
+        slots = np.arange(first, last + 1, dtype=np.int64)
+        positions = slots % self.capacity
+        valid = self.slots[positions] == slots
+        slots, positions = slots[valid], positions[valid]
+        buckets = ((slots * self.step - start) // resolution).astype(np.int64)
+        # slots are ascending, so are buckets: one segment per bucket
+        occupied, starts = np.unique(buckets, return_index=True)
+
+        metrics = {}
+        for name in names:
+            buffer = self.metrics.get(name)
+            mins = np.full(n_buckets, np.nan)
+            means = np.full(n_buckets, np.nan)
+            maxs = np.full(n_buckets, np.nan)
+            if buffer is not None and len(slots):
+                values = buffer[positions].astype(np.float64)
+                present = ~np.isnan(values)
+                counts = np.add.reduceat(present, starts)
+                sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    means[occupied] = np.where(counts > 0, sums / counts, np.nan)
+                # fmin / fmax ignore NaN unless the whole bucket is NaN
+                mins[occupied] = np.fmin.reduceat(values, starts)
+                maxs[occupied] = np.fmax.reduceat(values, starts)
+            metrics[name] = dict(
+                min=_to_list(mins), mean=_to_list(means), max=_to_list(maxs)
+            )
+
+        return dict(
+            start=start,
+            end=end,
+            resolution=resolution,
+            timestamps=(start + resolution * np.arange(n_buckets)).tolist(),
+            metrics=metrics,
+        )
+
+
+class History:
+    """
+    MachineHistory per machine, all with the same retention and step
+
+    Memory is bounded by machines * capacity * (8 + 4 * metrics) bytes,
+    e.g. ~190 MiB for 100 machines with 8 GPUs (26 metrics) over 24 hours
+    at 5 s resolution.
+    """
+
+    def __init__(
+        self, retention: float = HISTORY_RETENTION, step: float = HISTORY_STEP
+    ):
+        self.step = step
+        self.capacity = int(math.ceil(retention / step))
+        self.machines: Dict[str, MachineHistory] = {}
+        # nothing before this was recorded (e.g. before a restart)
+        self.started = time.time()
+
+    def record(self, name: str, status: dict) -> bool:
+        created_at = status.get("created_at")
+        if created_at is None:
+            return False
+        machine = self.machines.get(name)
+        if machine is None:
+            machine = self.machines[name] = MachineHistory(self.capacity, self.step)
+        return machine.record(created_at.timestamp(), extract_metrics(status))
+
+    def covers(self, start: float) -> bool:
+        """
+        Whether every report since `start` was recorded and is still kept
+        """
+        return start >= max(self.started, time.time() - self.capacity * self.step)
+
+    def metric_names(self, name: str) -> List[str]:
+        machine = self.machines.get(name)
+        return sorted(machine.metrics) if machine is not None else []
+
+    def resolution(
+        self, start: float, end: float, requested: Optional[float] = None
+    ) -> float:
+        """
+        The requested resolution, coarsened to a multiple of the step and to
+        at most MAX_POINTS buckets
+        """
+        span = max(end - start, self.step)
+        resolution = requested or span / DEFAULT_POINTS
+        resolution = max(resolution, span / MAX_POINTS, self.step)
+        return math.ceil(resolution / self.step) * self.step
+
+    def query(
+        self,
+        name: str,
+        metrics: List[str],
+        start: float,
+        end: float,
+        resolution: float,
+    ) -> dict:
+        machine = self.machines.get(name)
+        if machine is None:
+            machine = MachineHistory(1, self.step)
+        result = machine.query(metrics, start, end, resolution)
+        result["name"] = name
+        return result
+
+    def clear(self) -> None:
+        self.machines.clear()
+        self.started = time.time()
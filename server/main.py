@@ -1,14 +1,25 @@
 import os
 import sys
+import time
 from datetime import datetime
 from logging import INFO
 from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from puts import get_logger
+from starlette.concurrency import run_in_threadpool
 
-from .data_model import MachineStatus
+from .cache import StatusCache, canonical_fields
+from .data_model import BatchReport, DeltaReport, MachineStatus
+from .delta import expand_patch
+from .encoding import DecodingRoute, encoded_response
+from .history import History
+from .store import MetricStore
+from .stream import MAX_WINDOW, Broadcaster, Subscriber
 
 logger = get_logger()
 logger.setLevel(INFO)
@@ -17,6 +28,8 @@ logger.setLevel(INFO)
 # Constants
 
 app = FastAPI()
+# accept gzip / deflate and msgpack / cbor request bodies
+app.router.route_class = DecodingRoute
 origins = [
     "http://localhost",
     "http://localhost:8080",
@@ -32,6 +45,23 @@ app.add_middleware(
 )
 
 
+class GZipMiddleware(BaseGZipMiddleware):
+    """
+    GZipMiddleware that leaves /stream alone: its compressor would hold the
+    events back until enough of them pile up
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"] == "/stream":
+            await self.app(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+# compress responses for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
 # print timezone and current time
 print()
 logger.info(f"Environ 'TZ'    : {os.environ.get('TZ', 'N.A.')}")
@@ -41,6 +71,9 @@ logger.info(f"Python Version  : {sys.version}")
 print()
 
 
+# Everything below is per-process state: the server runs as a single worker
+# (MAX_WORKERS in docker-compose.yml), only the metric store is shared
+
 # Client whitelist
 DATA_CACHE = {
     "Default": {},
@@ -52,6 +85,77 @@ DATA_CACHE = {
     "Workstation#3 Richard": {},
     "Workstation#4 Marvin": {},
 }
+# last applied delta sequence number per machine
+DELTA_SEQ: Dict[str, int] = {}
+# per machine ring buffers of the numeric metrics, see history.py
+HISTORY = History()
+# latest statuses and long-term history on disk, see store.py
+STORE = MetricStore()
+# encoded statuses for /get and /stream, invalidated whenever DATA_CACHE changes
+GET_CACHE = StatusCache(DATA_CACHE)
+# /stream viewers
+STREAM = Broadcaster()
+
+
+def record(name: str, status: dict) -> None:
+    HISTORY.record(name, status)
+    STORE.record(name, status)
+
+
+def changed(name: str) -> None:
+    """
+    Let /get and /stream viewers know that DATA_CACHE[name] changed
+    """
+    GET_CACHE.invalidate(name)
+    STREAM.publish(name, lambda: GET_CACHE.machine(name))
+
+
+def select_machines(machines: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Comma-separated machine names -> the names in DATA_CACHE order (None: all)
+    """
+    if not machines:
+        return None
+    names = set(machines.split(","))
+    if not names <= DATA_CACHE.keys():
+        raise HTTPException(status_code=404)
+    return tuple(name for name in DATA_CACHE if name in names)
+
+
+def select_fields(fields: Optional[str]) -> Optional[str]:
+    """
+    Comma-separated MachineStatus fields -> canonical_fields (None: all)
+    """
+    fields = canonical_fields(fields)
+    if fields is None:
+        return None
+    unknown = {field.split(".")[0] for field in fields.split(",")}
+    unknown -= MachineStatus.__fields__.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return fields
+
+
+###############################################################################
+## LIFECYCLE
+
+
+@app.on_event("startup")
+def open_store():
+    STORE.open()
+    # pick up where the previous run left off
+    for name, status in STORE.snapshots().items():
+        if name in DATA_CACHE:
+            DATA_CACHE[name] = dict(MachineStatus.parse_obj(status).dict())
+    GET_CACHE.invalidate()
+    logger.info(f"Restored {sum(bool(v) for v in DATA_CACHE.values())} machines")
+
+
+@app.on_event("shutdown")
+def close_store():
+    STORE.close()
 
 
 ###############################################################################
@@ -64,8 +168,81 @@ async def read_root():
 
 
 @app.get("/get")
-async def get_status():
-    return DATA_CACHE
+async def get_status(
+    request: Request, machines: Optional[str] = None, fields: Optional[str] = None
+):
+    """
+    The latest status of every machine, or of the comma-separated `machines`
+
+    `fields` projects each status to a comma-separated list of fields, where
+    subfields of lists / objects are dotted, e.g.
+    cpu_usage,ram_usage,gpu_status.gpu_usage. Answers If-None-Match with 304
+    while none of the machines changed.
+    """
+    return GET_CACHE.response(request, select_machines(machines), select_fields(fields))
+
+
+@app.get("/stream")
+async def stream_status(machines: Optional[str] = None, window: float = 0):
+    """
+    Server-sent events: a "snapshot" of the machines' statuses (same as /get),
+    then an "update" {name, status} each time a machine's status changes
+
+    `machines` is a comma-separated list of the machines to follow (default:
+    all). Updates are coalesced per machine: a viewer that falls behind, or
+    asks for a `window` (seconds), only gets the latest status of each
+    machine that changed meanwhile.
+    """
+    names = select_machines(machines)
+    subscriber = Subscriber(
+        set(names) if names is not None else None,
+        window=min(max(window, 0), MAX_WINDOW),
+    )
+    return StreamingResponse(
+        # shared with /get, encoded once per change
+        STREAM.stream(subscriber, lambda: GET_CACHE.encoded(names)),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/history")
+async def get_history(
+    request: Request,
+    name: str,
+    metrics: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[float] = None,
+):
+    """
+    min / mean / max of a machine's metrics over [start, end] (epoch seconds,
+    default: the last hour), one bucket per `resolution` seconds
+
+    `metrics` is a comma-separated list, e.g. cpu_usage,gpu3.gpu_usage
+    (default: all recorded metrics of the machine). Ranges the in-memory
+    history does not cover (older, or from before a restart) are read from
+    the metric store.
+    """
+    if name not in DATA_CACHE:
+        raise HTTPException(status_code=404)
+
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 3600
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+
+    resolution = HISTORY.resolution(start, end, resolution)
+    if HISTORY.covers(start):
+        names = metrics.split(",") if metrics else HISTORY.metric_names(name)
+        result = HISTORY.query(name, names, start, end, resolution)
+    else:
+        names = metrics.split(",") if metrics else None
+        result = await run_in_threadpool(
+            STORE.query, name, names, start, end, resolution
+        )
+    return encoded_response(result, request)
 
 
 @app.post("/reset")
@@ -74,6 +251,11 @@ async def reset_status():
 
     for key in DATA_CACHE.keys():
         DATA_CACHE[key] = {}
+        changed(key)
+    DELTA_SEQ.clear()
+    HISTORY.clear()
+    # the long-term history on disk is kept
+    STORE.clear_snapshots()
 
     return {"msg": "OK"}
 
@@ -84,6 +266,74 @@ async def post_status(status: MachineStatus):
 
     if status.name in DATA_CACHE:
         DATA_CACHE[status.name] = dict(status.dict())
+        DELTA_SEQ.pop(status.name, None)
+        record(status.name, DATA_CACHE[status.name])
+        STORE.save(status.name, DATA_CACHE[status.name])
+        changed(status.name)
         return {"msg": "OK"}
     else:
         raise HTTPException(status_code=401)
+
+
+@app.post("/post/delta", status_code=201)
+async def post_status_delta(report: DeltaReport):
+    global DATA_CACHE
+
+    if report.name not in DATA_CACHE:
+        raise HTTPException(status_code=401)
+
+    if report.full is not None:
+        status = report.full
+        status.name = report.name
+        DATA_CACHE[report.name] = dict(status.dict())
+    elif report.patch is not None:
+        if DELTA_SEQ.get(report.name) != report.seq - 1:
+            # missed a report (or lost state on restart), ask for a baseline
+            raise HTTPException(status_code=409, detail="resync")
+        # only the patched fields are validated
+        patch = report.patch
+        patch.pop("name", None)
+        try:
+            patch = expand_patch(DATA_CACHE[report.name], patch)
+            patch = MachineStatus.parse_obj(patch).dict(include=set(patch.keys()))
+        except ValidationError as e:
+            # same answer as /post for the same fields
+            raise HTTPException(status_code=422, detail=e.errors())
+        DATA_CACHE[report.name] = {**DATA_CACHE[report.name], **patch}
+    else:
+        raise HTTPException(status_code=422, detail="Either full or patch required")
+
+    DELTA_SEQ[report.name] = report.seq
+    record(report.name, DATA_CACHE[report.name])
+    STORE.save(report.name, DATA_CACHE[report.name])
+    changed(report.name)
+    return {"msg": "OK"}
+
+
+@app.post("/post/batch", status_code=201)
+async def post_status_batch(batch: BatchReport):
+    global DATA_CACHE
+
+    if batch.name not in DATA_CACHE:
+        raise HTTPException(status_code=401)
+
+    # spooled reports are older than anything sent live, only keep the newest
+    # one if nothing more recent is cached
+    latest = None
+    for status in batch.statuses:
+        status.name = batch.name
+        # spooled reports fill the gap in the history
+        record(batch.name, dict(status.dict()))
+        if latest is None or status.created_at > latest.created_at:
+            latest = status
+
+    current = DATA_CACHE[batch.name]
+    if latest is not None and (
+        not current or current.get("created_at") < latest.created_at
+    ):
+        DATA_CACHE[batch.name] = dict(latest.dict())
+        DELTA_SEQ.pop(batch.name, None)
+        STORE.save(batch.name, DATA_CACHE[batch.name])
+        changed(batch.name)
+
+    return {"msg": "OK", "accepted": len(batch.statuses)}
@@ -0,0 +1,441 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from logging import INFO
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from puts import get_logger
+
+from .encoding import encode
+from .history import extract_metrics
+
+logger = get_logger()
+logger.setLevel(INFO)
+
+###############################################################################
+## Constants
+
+STORE_PATH = os.environ.get("STORE_PATH", "data/metrics.db")
+FLUSH_INTERVAL = 1.0  # seconds, the writer commits at most once per interval
+MAX_BATCH = 10000  # queued writes per transaction
+QUEUE_SIZE = 100000  # queued writes before new ones are dropped
+ROLLUP_INTERVAL = 60  # seconds between rollup passes
+PRUNE_INTERVAL = 3600  # seconds between retention passes
+
+# tier: (table, bucket seconds, retention seconds), finest first
+TIERS = {
+    "raw": ("samples", 1, 86400),
+    "1m": ("rollup_1m", 60, 7 * 86400),
+    "1h": ("rollup_1h", 3600, 365 * 86400),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    machine TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (machine, metric)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    series INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_1m (
+    series INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_1h (
+    series INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    machine TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    status BLOB NOT NULL
+);
+"""
+
+# raw samples are buckets of one sample
+BUCKET_QUERY = {
+    "raw": "SELECT CAST((ts - ?) / ? AS INTEGER), count(value), sum(value), "
+    "min(value), max(value) FROM samples "
+    "WHERE series = ? AND ts >= ? AND ts <= ? GROUP BY 1",
+    "1m": "SELECT CAST((ts - ?) / ? AS INTEGER), sum(count), sum(sum), "
+    "min(min), max(max) FROM rollup_1m "
+    "WHERE series = ? AND ts >= ? AND ts <= ? GROUP BY 1",
+    "1h": "SELECT CAST((ts - ?) / ? AS INTEGER), sum(count), sum(sum), "
+    "min(min), max(max) FROM rollup_1h "
+    "WHERE series = ? AND ts >= ? AND ts <= ? GROUP BY 1",
+}
+
+ROLLUP_1M = (
+    "INSERT OR REPLACE INTO rollup_1m "
+    "SELECT series, ts - ts % 60, count(value), sum(value), min(value), max(value) "
+    "FROM samples WHERE series = ? AND ts >= ? AND ts < ? GROUP BY 2"
+)
+ROLLUP_1H = (
+    "INSERT OR REPLACE INTO rollup_1h "
+    "SELECT series, ts - ts % 3600, sum(count), sum(sum), min(min), max(max) "
+    "FROM rollup_1m WHERE series = ? AND ts >= ? AND ts < ? GROUP BY 2"
+)
+
+SAVE_SNAPSHOT = (
+    "INSERT INTO snapshots VALUES (?, ?, ?) ON CONFLICT (machine) DO UPDATE "
+    "SET created_at = excluded.created_at, status = excluded.status "
+    "WHERE excluded.created_at >= snapshots.created_at"
+)
+
+# queued write kinds
+RECORD, SAVE, CLEAR_SNAPSHOTS, FLUSH = "record", "save", "clear_snapshots", "flush"
+
+
+def _ranges(buckets: Set[int], size: int) -> List[Tuple[int, int]]:
+    """
+    Contiguous [start, end) ranges covering the given bucket start times
+    """
+    ranges: List[Tuple[int, int]] = []
+    for bucket in sorted(buckets):
+        if ranges and ranges[-1][1] == bucket:
+            ranges[-1] = (ranges[-1][0], bucket + size)
+        else:
+            ranges.append((bucket, bucket + size))
+    return ranges
+
+
+###############################################################################
+## Store
+
+
+class MetricStore:
+    """
+    SQLite (WAL) persistence of the latest status and the metric history
+
+    Request handlers only put writes on a queue: a background writer thread
+    commits them in batches (one transaction per FLUSH_INTERVAL), so no
+    request waits on the disk. With synchronous=NORMAL, WAL commits are not
+    fsynced, only checkpoints are; a crash may lose the last commits but
+    never corrupts the database.
+
+    Raw samples are rolled up into 1-minute and 1-hour buckets (count, sum,
+    min, max) by the writer: every minute it recomputes the buckets that
+    received samples since the previous pass, so spooled reports arriving
+    late land in the rollups as well. Each tier is pruned to its own
+    retention (TIERS). Reads use their own connection per thread, WAL lets
+    them run while the writer commits.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self.queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        # writer thread state
+        self._series: Dict[Tuple[str, str], int] = {}
+        self._dirty: Dict[int, Set[int]] = {}  # series -> dirty minutes
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def open(self) -> None:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._series = {
+            (machine, metric): series
+            for series, machine, metric in conn.execute(
+                "SELECT id, machine, metric FROM series"
+            )
+        }
+        conn.close()
+        self._thread = threading.Thread(
+            target=self._run, name="metric-store", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Metric store: {self.path}")
+
+    def close(self) -> None:
+        """
+        Commit everything queued and stop the writer
+        """
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    ###########################################################################
+    ## Writes (request path)
+
+    def _put(self, item: tuple) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            logger.warning("Metric store is behind, dropping a write")
+
+    def record(self, name: str, status: dict) -> None:
+        """
+        Queue the metrics of a status for the history
+        """
+        self._put((RECORD, name, status))
+
+    def save(self, name: str, status: dict) -> None:
+        """
+        Queue a status as the machine's latest one, restored on startup
+        """
+        self._put((SAVE, name, status))
+
+    def clear_snapshots(self) -> None:
+        self._put((CLEAR_SNAPSHOTS,))
+
+    ###########################################################################
+    ## Writer Thread
+
+    def _run(self) -> None:
+        conn = self._connect()
+        next_rollup = time.monotonic() + ROLLUP_INTERVAL
+        next_prune = time.monotonic()
+        stopping = False
+        while not stopping:
+            items = []
+            try:
+                item = self.queue.get(timeout=ROLLUP_INTERVAL)
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while item is not None:
+                    items.append(item)
+                    if len(items) >= MAX_BATCH or item[0] == FLUSH:
+                        break
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                stopping = item is None
+            except queue.Empty:
+                pass
+
+            flushes = [item[1] for item in items if item[0] == FLUSH]
+            try:
+                if items:
+                    self._write(conn, items)
+                now = time.monotonic()
+                if stopping or flushes or now >= next_rollup:
+                    self._rollup(conn)
+                    next_rollup = now + ROLLUP_INTERVAL
+                if now >= next_prune:
+                    self._prune(conn)
+                    next_prune = now + PRUNE_INTERVAL
+            except Exception as e:
+                logger.error(f"Metric store: {e}")
+            for done in flushes:
+                done.set()
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+    def _series_id(self, conn: sqlite3.Connection, machine: str, metric: str) -> int:
+        key = (machine, metric)
+        series = self._series.get(key)
+        if series is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO series (machine, metric) VALUES (?, ?)", key
+            )
+            series = self._series[key] = conn.execute(
+                "SELECT id FROM series WHERE machine = ? AND metric = ?", key
+            ).fetchone()[0]
+        return series
+
+    def _write(self, conn: sqlite3.Connection, items: list) -> None:
+        samples = []
+        snapshots: Dict[str, dict] = {}
+        conn.execute("BEGIN")
+        try:
+            for item in items:
+                kind = item[0]
+                if kind == RECORD:
+                    _, name, status = item
+                    created_at = status.get("created_at")
+                    if created_at is None:
+                        continue
+                    ts = int(created_at.timestamp())
+                    for metric, value in extract_metrics(status).items():
+                        if value is None:
+                            continue
+                        series = self._series_id(conn, name, metric)
+                        samples.append((series, ts, value))
+                        self._dirty.setdefault(series, set()).add(ts - ts % 60)
+                elif kind == SAVE:
+                    _, name, status = item
+                    # only the newest status of each machine in the batch
+                    previous = snapshots.get(name)
+                    if previous is None or (
+                        previous["created_at"] <= status["created_at"]
+                    ):
+                        snapshots[name] = status
+                elif kind == CLEAR_SNAPSHOTS:
+                    snapshots.clear()
+                    conn.execute("DELETE FROM snapshots")
+
+            conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?)", samples)
+            conn.executemany(
+                SAVE_SNAPSHOT,
+                [
+                    (name, status["created_at"].timestamp(), encode(status))
+                    for name, status in snapshots.items()
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rollup(self, conn: sqlite3.Connection) -> None:
+        """
+        Recompute the 1-minute and 1-hour buckets that received samples
+        """
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        conn.execute("BEGIN")
+        try:
+            for series, minutes in dirty.items():
+                for start, end in _ranges(minutes, 60):
+                    conn.execute(ROLLUP_1M, (series, start, end))
+                hours = {minute - minute % 3600 for minute in minutes}
+                for start, end in _ranges(hours, 3600):
+                    conn.execute(ROLLUP_1H, (series, start, end))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # try again on the next pass
+            for series, minutes in dirty.items():
+                self._dirty.setdefault(series, set()).update(minutes)
+            raise
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """
+        Delete the samples / buckets older than each tier's retention
+        """
+        now = time.time()
+        series_ids = [(series,) for series in self._series.values()]
+        conn.execute("BEGIN")
+        try:
+            for table, _, retention in TIERS.values():
+                cutoff = int(now - retention)
+                # per series: a range scan of the primary key
+                conn.executemany(
+                    f"DELETE FROM {table} WHERE series = ? AND ts < {cutoff}",
+                    series_ids,
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self) -> None:
+        """
+        Wait until everything queued so far is committed and rolled up
+        """
+        done = threading.Event()
+        self.queue.put((FLUSH, done))
+        done.wait()
+
+    ###########################################################################
+    ## Reads
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def snapshots(self) -> Dict[str, dict]:
+        """
+        The latest saved status of every machine, as parsed JSON
+        """
+        return {
+            machine: json.loads(status)
+            for machine, status in self._reader().execute(
+                "SELECT machine, status FROM snapshots"
+            )
+        }
+
+    @staticmethod
+    def tier(start: float, resolution: float, now: float = None) -> str:
+        """
+        The coarsest tier still fine enough for `resolution` that holds `start`
+        """
+        now = now or time.time()
+        best = "1h"
+        for tier, (_, bucket, retention) in TIERS.items():
+            if bucket <= resolution and start >= now - retention:
+                best = tier
+        return best
+
+    def query(
+        self,
+        name: str,
+        metrics: Optional[List[str]],
+        start: float,
+        end: float,
+        resolution: float,
+    ) -> dict:
+        """
+        min / mean / max of each metric per `resolution`-second bucket, same
+        shape as History.query (default: every metric stored for the machine)
+        """
+        tier = self.tier(start, resolution)
+        bucket = TIERS[tier][1]
+        # whole buckets of the tier
+        resolution = -(-resolution // bucket) * bucket
+        n_buckets = max(1, int(-(-(end - start) // resolution)))
+        conn = self._reader()
+        series_ids = dict(
+            conn.execute(
+                "SELECT metric, id FROM series WHERE machine = ?", (name,)
+            ).fetchall()
+        )
+
+        if metrics is None:
+            metrics = sorted(series_ids)
+
+        result = {}
+        for metric in metrics:
+            mins: List[Optional[float]] = [None] * n_buckets
+            means: List[Optional[float]] = [None] * n_buckets
+            maxs: List[Optional[float]] = [None] * n_buckets
+            series = series_ids.get(metric)
+            if series is not None:
+                rows = conn.execute(
+                    BUCKET_QUERY[tier], (start, resolution, series, start, end)
+                )
+                for i, count, total, low, high in rows:
+                    if 0 <= i < n_buckets and count:
+                        mins[i] = round(low, 5)
+                        means[i] = round(total / count, 5)
+                        maxs[i] = round(high, 5)
+            result[metric] = dict(min=mins, mean=means, max=maxs)
+
+        return dict(
+            name=name,
+            start=start,
+            end=end,
+            resolution=resolution,
+            tier=tier,
+            timestamps=[start + resolution * i for i in range(n_buckets)],
+            metrics=result,
+        )
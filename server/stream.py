@@ -0,0 +1,104 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from .encoding import JSON, encode, encode_map
+
+###############################################################################
+## Constants
+
+KEEPALIVE = 15  # seconds, a comment line on idle streams keeps proxies open
+MAX_WINDOW = 60  # seconds, longest coalescing window a viewer can ask for
+
+
+def sse_event(event: str, data: bytes) -> bytes:
+    # JSON has no raw newlines, so one data line is enough
+    return b"event: " + event.encode("ascii") + b"\ndata: " + data + b"\n\n"
+
+
+###############################################################################
+## Subscribers
+
+
+class Subscriber:
+    """
+    One viewer's stream: the latest pending event per machine
+
+    A newer update of a machine replaces the pending one, so a consumer that
+    falls behind gets the latest state of each machine rather than a backlog;
+    pending events never exceed one per machine.
+    """
+
+    def __init__(self, names: Optional[Set[str]] = None, window: float = 0):
+        self.names = names  # None: every machine
+        self.window = window
+        self.pending: Dict[str, bytes] = {}
+        self.wake = asyncio.Event()
+
+    def wants(self, name: str) -> bool:
+        return self.names is None or name in self.names
+
+    def push(self, name: str, event: bytes) -> None:
+        self.pending[name] = event
+        self.wake.set()
+
+    async def events(self) -> AsyncIterator[bytes]:
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if self.window:
+                # let the burst settle, later updates replace pending ones
+                await asyncio.sleep(self.window)
+            self.wake.clear()
+            pending, self.pending = self.pending, {}
+            yield b"".join(pending.values())
+
+
+class Broadcaster:
+    """
+    Fans out machine updates to every subscribed viewer
+
+    An update is serialised once, on publish, and the same bytes are queued
+    to every subscriber that wants the machine; nothing is encoded when no
+    one is subscribed. The status itself comes already encoded (shared with
+    /get, see StatusCache).
+    """
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, name: str, status: Callable[[], bytes]) -> None:
+        """
+        `status` returns the machine's status as JSON, called at most once
+        """
+        event = None
+        for subscriber in self.subscribers:
+            if not subscriber.wants(name):
+                continue
+            if event is None:
+                data = encode_map([("name", encode(name)), ("status", status())], JSON)
+                event = sse_event("update", data)
+            subscriber.push(name, event)
+
+    async def stream(
+        self, subscriber: Subscriber, snapshot: Callable[[], bytes]
+    ) -> AsyncIterator[bytes]:
+        """
+        A snapshot, then the subscriber's updates until the viewer disconnects
+        """
+        # no await between the two: no update can fall in between
+        self.subscribe(subscriber)
+        try:
+            yield sse_event("snapshot", snapshot())
+            async for chunk in subscriber.events():
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)